@@ -1,8 +1,16 @@
 import streamlit as st 
 import pandas as pd
 import datetime
+import hashlib
+import os
 import numpy as np
 import plotly.express as px
+from so_projection import (
+    MAX_HORIZON, get_forecast_dates, prepare_so, next_day_so, wh_daily_demand, project_hub_so, simulate_so_scenarios, pivot_by_day, trigger_status, hub_chart_series,
+)
+from forecast_store import build_forecast_cube, forecast_source_files
+from batch_io import batch_result_mtimes, read_batch_results
+from dimensions import HUB_IDS, WH_CODE_NAMES, hub_codes, hub_display, hub_name, named_hub_codes, wh_name
 
 #st.set_page_config(layout="wide") 
 
@@ -16,6 +24,8 @@ st.sidebar.markdown(f"📅 Today’s Date: **{today}**")
 
 # File Upload Section
 so_file = st.sidebar.file_uploader("Upload SQL-estimated SO (after 9 PM best :) )", type=["xlsx"])
+horizon = st.sidebar.slider("Projection horizon (D+N days)", min_value=1, max_value=MAX_HORIZON, value=6)
+carry_over = st.sidebar.checkbox("Carry hub stock day to day (triggered SO arrives next day)", value=True)
 
 st.markdown(
     """
@@ -68,103 +78,72 @@ with st.expander("View Description"):
      
     """)
 
+# Tonight's headless batch run (so_batch.py) is shown when no SO file is uploaded
+batch_results = None if so_file else read_batch_results(today)
+if batch_results:
+    horizon = min(horizon, int(batch_results[1]["day"].max()))
+    st.sidebar.info(f"No SO uploaded: showing the precomputed batch run for {today} (D+1 to D+{horizon})")
+
 # Sidebar navigation
-tab1, tab2 = st.tabs(["Next Day SO Prediction", "D+1 to D+6 SO Prediction"])
+tab1, tab2 = st.tabs(["Next Day SO Prediction", f"D+1 to D+{horizon} SO Prediction"])
 #page = st.sidebar.radio("Select Page", ["D+0 SO Prediction", "D+1 to D+6 SO Prediction"])
 #dry_forecast_file = st.file_uploader("Upload Dry Demand Forecast CSV", type=["xlsx"])
 #fresh_cbn_forecast_file = st.file_uploader("Upload Fresh CBN Demand Forecast CSV", type=["xlsx"])
 #fresh_pgs_forecast_file = st.file_uploader("Upload Fresh PGS Demand Forecast CSV", type=["xlsx"])
 
-dry_forecast_df = pd.read_excel("Forecast Mar Dry.xlsx")
-fresh_cbn_forecast_df = pd.read_excel("Forecast Mar Fresh CBN.xlsx")
-fresh_pgs_forecast_df = pd.read_excel("Forecast Mar Fresh PGS.xlsx")
+# Per-hub chart series, built once per projection source (SO upload and forecast workbooks, or
+# batch result files), start day and projection settings
+@st.cache_data
+def cached_hub_chart_series(source_key, start, horizon, carry_over, _projection_df):
+    return hub_chart_series(_projection_df, start)
+
+
+# Daily forecast cube (date x product type) over all monthly forecast workbooks,
+# rebuilt only when a workbook is added or changed
+@st.cache_data
+def load_forecast_cube(workbook_mtimes):
+    return build_forecast_cube()
 
 
 if so_file:
     # Load Data
-    final_so_df = pd.read_excel(so_file)
+    final_so_df = prepare_so(pd.read_excel(so_file))
 
     
-    # Get forecast dates D+1 to D+6
+    # Get forecast dates D+1 to D+N
 
-    forecast_dates = [(today + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(1, 7)]
+    forecast_dates = get_forecast_dates(today, horizon)
     
-    # Filter forecast data for D+1 to D+6
-    dry_forecast_df = dry_forecast_df[dry_forecast_df["date_key"].isin(forecast_dates)]
-    fresh_cbn_forecast_df = fresh_cbn_forecast_df[fresh_cbn_forecast_df["date_key"].isin(forecast_dates)]
-    fresh_pgs_forecast_df = fresh_pgs_forecast_df[fresh_pgs_forecast_df["date_key"].isin(forecast_dates)]
-
-    # Convert IDs to integer type
-    final_so_df[['wh_id', 'hub_id']] = final_so_df[['wh_id', 'hub_id']].apply(pd.to_numeric)
-
-    # Exclude specific hubs
-    final_so_df["hub_id"] = final_so_df["hub_id"].astype(int)
-    final_so_df = final_so_df[~final_so_df['hub_id'].isin([537, 758])]
-    final_so_df = final_so_df[~final_so_df['wh_id'].isin([583])]
-
-     # Hub ID to Hub Name mapping
-    hub_name_mapping = {
-        98: "MTG - Menteng",
-        121: "BS9 - Bintaro Sektor 9",
-        125: "PPN - Pos Pengumben",
-        152: "LBB - Lebak Bulus",
-        189: "SRP - Serpong Utara",
-        201: "MSB - Medan Satria Bekasi",
-        206: "JTB - Jatibening",
-        207: "GWB - Grand Wisata Bekasi",
-        223: "CT2 - Citra 2",
-        261: "CNR - Cinere",
-        288: "MRG - Margonda",
-        517: "FTW - Fatmawati",
-        523: "JLB - Jelambar",
-        529: "BSX - New BSD",
-        538: "KJT - Kramat Jati",  # Excluded
-        591: "MRY - Meruya",
-        615: "GPL - Gudang Peluru",
-        619: "TSY - Transyogi",
-        626: "DST - Duren Sawit",
-        634: "PPL - Panglima Polim",
-        648: "DNS - Danau Sunter",
-        654: "TGX - New TGC",
-        657: "APR - Ampera",
-        669: "BRY - Buncit Raya",
-        672: "KPM - Kapuk Muara",
-        759: "CWG - Cawang",  # Excluded
-        763: "PSG - Pisangan",
-        767: "PKC - Pondok Kacang",
-        773: "PGD - Pulo Gadung",
-        776: "BGS - Boulevard Gading Serpong"
-    }
-
-    # WH ID to WH Name mapping
-    wh_name_mapping = {
-        40: "KOS - WH Kosambi",
-        772: "STL - Sentul",
-        160: "PGS - Pegangsaan",
-        661: "CBN - WH Cibinong"
-    }
+    # Load the forecast cube
+    workbook_mtimes = tuple((path, os.path.getmtime(path)) for _, path in forecast_source_files())
+    forecast_cube = load_forecast_cube(workbook_mtimes)
+
+    # Compute Predicted SO Qty D+0
+    final_so_df = next_day_so(final_so_df)
+
+    # Allocate daily demand forecast to WHs and project every hub for all days at once
+    wh_demand = wh_daily_demand(forecast_cube, forecast_dates)
+    projection_df = project_hub_so(final_so_df, wh_demand, carry_over=carry_over)
+
+elif batch_results:
+    final_so_df, projection_df = batch_results
+    projection_df = projection_df[projection_df["day"] <= horizon]
+
+if so_file or batch_results:
 
     with tab1:
         #st.subheader("Next Day SO Prediction")
     
-         # Compute Predicted SO Qty D+0
-        final_so_df['Predicted SO Qty D+0'] = ((final_so_df['Sum of maxqty'] - final_so_df['Sum of hub_qty']) / 
-                                               final_so_df['Sum of multiplier']) * final_so_df['Sum of multiplier']
-        final_so_df['Predicted SO Qty D+0'] = final_so_df['Predicted SO Qty D+0'].clip(lower=0).astype(int)
-    
-        final_so_df["WH Name"] = final_so_df["wh_id"].map(wh_name_mapping)
-        final_so_df["Hub Name"] = final_so_df["hub_id"].map(hub_name_mapping)
-        final_so_df = final_so_df.rename(columns={"wh_id": "WH ID"})
-
         def highlight_final_so(s):
             return ['background-color: #FFFACD' if s.name == 'Sum of qty_so_final' else '' for _ in s]
 
         # Create a WH-level aggregated DataFrame
-        wh_summary_df = final_so_df.groupby("WH Name").agg({
+        wh_summary_df = final_so_df.groupby("wh_code").agg({
         'Sum of qty_so': 'sum',
         'Predicted SO Qty D+0': 'sum',
         'Sum of qty_so_final': 'sum'
         }).reset_index()
+        wh_summary_df.insert(0, "WH Name", wh_name(wh_summary_df.pop("wh_code")))
         
         # Apply styling
         styled_wh_summary = wh_summary_df.style.apply(highlight_final_so, subset=["Sum of qty_so_final"])
@@ -175,11 +154,12 @@ if so_file:
         
         # Select WH dropdown
         st.markdown('<h4 style="color: maroon;">Summary by Hub</h4>', unsafe_allow_html=True)
-        wh_options = final_so_df["WH Name"].unique().tolist()
-        selected_wh = st.selectbox("Select WH", wh_options)
+        wh_options = pd.unique(final_so_df["wh_code"]).tolist()
+        selected_wh_code = st.selectbox("Select WH", wh_options, format_func=lambda code: WH_CODE_NAMES[code])
         
-        # Filter DataFrame by selected WH
-        filtered_so_df = final_so_df[final_so_df["WH Name"] == selected_wh]
+        # Filter DataFrame by selected WH, hub names attached to the filtered rows only
+        filtered_so_df = final_so_df[final_so_df["wh_code"] == selected_wh_code].copy()
+        filtered_so_df["Hub Name"] = hub_name(filtered_so_df["hub_code"])
         
         # Apply styling to filtered DataFrame
         styled_filtered_so = filtered_so_df[["Hub Name", "Sum of qty_so", "Sum of qty_so_final", "Predicted SO Qty D+0"]].style.apply(
@@ -191,94 +171,46 @@ if so_file:
         st.dataframe(styled_filtered_so, column_config={col: st.column_config.TextColumn(width="small") for col in filtered_so_df.columns}, use_container_width=True)
         #st.dataframe(filtered_so_df[["Hub Name", "Sum of qty_so", "Sum of qty_so_final", "Predicted SO Qty D+0"]],column_config={col: st.column_config.TextColumn(width="small") for col in filtered_so_df.columns})
 
-        csv1 = final_so_df.to_csv(index=False).encode('utf-8')
+        csv1 = final_so_df.assign(**{"WH Name": wh_name(final_so_df["wh_code"]), "Hub Name": hub_name(final_so_df["hub_code"])}).to_csv(index=False).encode('utf-8')
         st.download_button("Download Next Day SO Prediction", csv1, "next_day_so_prediction.csv", "text/csv")
    
     
     with tab2:
             
-        # Initialize result DataFrame
-        results = []
-        
-        for day, forecast_date in enumerate(forecast_dates, start=1):
-            # Get daily demand forecast
-            daily_dry_forecast = dry_forecast_df[dry_forecast_df["date_key"] == forecast_date]["Forecast Step 3"].sum()
-            daily_fresh_cbn_forecast = fresh_cbn_forecast_df[fresh_cbn_forecast_df["date_key"] == forecast_date]["Forecast Step 3"].sum()
-            daily_fresh_pgs_forecast = fresh_pgs_forecast_df[fresh_pgs_forecast_df["date_key"] == forecast_date]["Forecast Step 3"].sum()
-    
-            # Allocate Demand Forecast to WHs
-            dry_demand_allocation = {772: int(daily_dry_forecast * (1/3)), 40: int(daily_dry_forecast * (2/3))}
-            fresh_demand_allocation = {661: int(daily_fresh_cbn_forecast), 160: int(daily_fresh_pgs_forecast)}
-            
-            daily_result = final_so_df.copy()
-            daily_result[f'Updated Hub Qty D+{day}'] = daily_result['Sum of hub_qty']
-            
-            for wh_id in final_so_df['WH ID'].unique():
-                for hub_id in final_so_df.loc[final_so_df['WH ID'] == wh_id, 'hub_id'].unique():
-                    hub_mask = (daily_result['WH ID'] == wh_id) & (daily_result['hub_id'] == hub_id)
-                    total_so_final = final_so_df.loc[final_so_df['WH ID'] == wh_id, 'Sum of qty_so_final'].sum()
-                    
-                    if total_so_final > 0:
-                        hub_forecast = ((final_so_df.loc[hub_mask, 'Sum of qty_so_final'] / total_so_final) * 
-                                        (dry_demand_allocation.get(wh_id, 0) + fresh_demand_allocation.get(wh_id, 0))).astype(int)
-                    else:
-                        hub_forecast = 0
-
-                    daily_result.loc[hub_mask, f'Updated Hub Qty D+{day}'] -= hub_forecast
-                    daily_result.loc[hub_mask, f'Updated Hub Qty D+{day}'] = daily_result.loc[hub_mask, f'Updated Hub Qty D+{day}'].clip(lower=0)
-            
-            # Compute Predicted SO Quantity
-            daily_result[f'Predicted SO Qty D+{day}'] = ((daily_result['Sum of maxqty'] - daily_result[f'Updated Hub Qty D+{day}']) / 
-                                                        daily_result['Sum of multiplier']) * daily_result['Sum of multiplier'] 
-            #daily_result[f'Predicted SO Qty D+{day}'] = daily_result[f'Predicted SO Qty D+{day}']*1
-            
-            daily_result.loc[daily_result['WH ID'] == 40, f'Predicted SO Qty D+{day}'] *= 0.71
-            daily_result.loc[daily_result['WH ID'] == 772, f'Predicted SO Qty D+{day}'] *= 0.535
-            
-            daily_result[f'Predicted SO Qty D+{day}'] = daily_result[f'Predicted SO Qty D+{day}'].clip(lower=0).astype(int)
-            
-            #sample_wh = daily_result[(daily_result["wh_id"] == 160) & (daily_result["hub_id"] == 121)].head()
-            #st.dataframe(sample_wh[["Sum of maxqty", "Updated Hub Qty D+1", "Sum of multiplier", "Predicted SO Qty D+1"]])
-            
-            def check_triggered(row, day):
-                if row[f'Predicted SO Qty D+{day}'] == 0:
-                    return "Not Triggered"
-                return "Triggered" if row[f'Predicted SO Qty D+{day}'] - row['Sum of reorder_point'] < 0 else "Not Triggered"
-            
-            daily_result[f'SO vs Reorder Point D+{day}'] = daily_result.apply(lambda row: check_triggered(row, day), axis=1)
-            daily_result = daily_result.rename(columns={"wh_id": "WH ID", "hub_id": "Hub ID"})
-            results.append(daily_result[["WH ID", "Hub ID", "Sum of maxqty", f"Updated Hub Qty D+{day}", f"Predicted SO Qty D+{day}", f"SO vs Reorder Point D+{day}"]])
+        # Long (WH, hub, day) table pivoted once for display
+        final_results_df = pivot_by_day(
+            projection_df.rename(columns={"hub_id": "Hub ID"}),
+            ["WH ID", "Hub ID"],
+            {"Updated Hub Qty": "sum", "Predicted SO Qty": "sum", "Triggered": "max"},
+            static={"Sum of maxqty": "sum"},
+        )
 
-            
-        
-        # Merge results into a single DataFrame
-        final_results_df = results[0]
-        for df in results[1:]:
-            final_results_df = final_results_df.merge(df, on=["WH ID", "Hub ID","Sum of maxqty"], how="left")
+        # Status labels are a categorical view of the boolean trigger matrix
+        trigger_cols = [f"Triggered D+{day}" for day in range(1, horizon + 1)]
+        for day in range(1, horizon + 1):
+            final_results_df[f"SO vs Reorder Point D+{day}"] = trigger_status(final_results_df[f"Triggered D+{day}"])
             
         #final_results_df["WH Name"] = final_results_df["wh_id"].map(wh_name_mapping)
         
         # Display Results
         #st.subheader("D+1 to D+6 SO Prediction")
         
-        def highlight_triggered(val):
-            color = 'background-color: lightgreen' if val == "Triggered" else 'background-color: lightcoral'
-            return color
+        def highlight_triggered(triggered):
+            return np.where(triggered, 'background-color: lightgreen', 'background-color: lightcoral')
     
         #final_results_df = final_results_df.rename(columns={"wh_id": "WH ID", "hub_id": "Hub ID"})
 
         # Dropdown for selecting WH ID
     
-        hub_options = final_results_df['Hub ID'].unique()
-        # Combine Hub ID and Name for display
-        final_results_df["Hub Name"] = final_results_df["Hub ID"].map(hub_name_mapping)
-        final_results_df["Hub Display"] = final_results_df["Hub ID"].astype(str) + " - " + final_results_df["Hub Name"]
+        # Hub options are hub codes, shown as "<Hub ID> - <Hub Name>"; unnamed hubs are left out
+        hub_options = named_hub_codes(hub_codes(final_results_df["Hub ID"]))
 
         st.markdown("""
         
         **Demand Forecast assumptions:**  
         - *Dry*: 2/3 demand for KOS, 1/3 for STL  
         - *Fresh*: By L2 Category (CBN -> Telur, Roti & Pastry, Sayur, Buah) 
+        - *Carry over* (sidebar): hub stock is carried from day to day, and a triggered SO arrives at the hub the next day, capped at max qty
         """)
 
 
@@ -286,97 +218,35 @@ if so_file:
         col1, col2 = st.columns(2)
         with col1:
             #selected_hub = st.select_slider("Select WH", options=final_results_df["Hub Display"].dropna().unique())
-            selected_hub = st.selectbox("Select Hub", final_results_df["Hub Display"].dropna().unique())  # Drop NaN to avoid excluded hubs
+            selected_hub_code = st.selectbox("Select Hub", hub_options, format_func=hub_display)
             
         with col2:
             product_type = st.selectbox("Select Product Type:", ["Dry", "Fresh"])
             
     
-        # Filter the DataFrame for the selected hub
-        selected_hub_id = int(selected_hub.split(" - ")[0])  # Extracts ID
-        filtered_df = final_results_df[final_results_df["Hub ID"] == selected_hub_id]
-    
-        #filtered_df = final_results_df[final_results_df['Hub ID'] == selected_hub].copy()
-        
-        # Rename D+1 to D+6 columns to actual dates
-        forecast_dates_dict = {f"Predicted SO Qty D+{i+1}": (today + datetime.timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(6)}
-        filtered_df.rename(columns=forecast_dates_dict, inplace=True)
-        
-        # Reshape the data for plotting
-        melted_df = filtered_df.melt(id_vars=['WH ID'], 
-                                      value_vars=list(forecast_dates_dict.values()), 
-                                      var_name='Date', 
-                                      value_name='SO Quantity')
-        
-        # Convert Date column to datetime type for proper plotting
-        melted_df['Date'] = pd.to_datetime(melted_df['Date'])
-        
-        # Separate data for Dry WHs (772, 40) and Fresh WHs (160, 661)
-        dry_wh_df = melted_df[melted_df['WH ID'].isin([772, 40])]
-        fresh_wh_df = melted_df[melted_df['WH ID'].isin([160, 661])]
-        
-        # Create Dry WHs line chart
-        
-        # Show selected chart
-        if product_type == "Dry":
-            # Dry WHs Line Chart
-            fig_dry = px.line(
-                dry_wh_df,
-                x='Date', 
-                y='SO Quantity', 
-                color='WH ID',  
-                markers=True  
-                #title=f'Dry Warehouses (KOS & STL) - Predicted SO Quantity for Hub {selected_hub}'
-            )
-        
-            # Add data labels
-            for wh in dry_wh_df['WH ID'].unique():
-                wh_data = dry_wh_df[dry_wh_df['WH ID'] == wh]
-                fig_dry.add_scatter(
-                    x=wh_data['Date'], 
-                    y=wh_data['SO Quantity'] * 1.05, 
-                    mode='text', 
-                    text=wh_data['SO Quantity'].astype(str), 
-                    textposition="top center",  # Adjusted placement
-                    textfont=dict(color="gray", size=11, weight="bold"),  # Bold Red Text
-                    showlegend=False
-                )
-
-                fig_dry.update_layout(
-                    margin=dict(t=10),  # Reduce top space for Dry WH chart
-                )
-        
-            st.plotly_chart(fig_dry, use_container_width=True)
-        
+        # Series for the selected hub come from the per-source cache, so switching hub or
+        # product type only renders a figure. A changed forecast workbook or a new batch run
+        # the same day gives a new key.
+        if so_file:
+            source_key = (hashlib.md5(so_file.getvalue()).hexdigest(), workbook_mtimes)
         else:
-            # Fresh WHs Line Chart
-            fig_fresh = px.line(
-                fresh_wh_df,
-                x='Date', 
-                y='SO Quantity', 
-                color='WH ID',  
-                markers=True  
-                #title=f'Fresh Warehouses (PGS & CBN) - Predicted SO Quantity for Hub {selected_hub}'
-            )
-        
-            # Add data labels
-            for wh in fresh_wh_df['WH ID'].unique():
-                wh_data = fresh_wh_df[fresh_wh_df['WH ID'] == wh]
-                fig_fresh.add_scatter(
-                    x=wh_data['Date'], 
-                    y=wh_data['SO Quantity'] + 10, 
-                    mode='text', 
-                    text=wh_data['SO Quantity'].astype(str), 
-                    textposition="top center",  # Adjusted placement
-                    textfont=dict(color="gray", size=11, weight="bold"),  # Bold Red Text
-                    showlegend=False
-                )
-
-                fig_fresh.update_layout(
-                    margin=dict(t=10),  # Reduce top space for Fresh WH chart
-                )
-        
-            st.plotly_chart(fig_fresh, use_container_width=True)
+            source_key = ("batch", batch_result_mtimes(today))
+        chart_series = cached_hub_chart_series(source_key, today, horizon, carry_over, projection_df)
+        selected_hub_id = int(HUB_IDS[selected_hub_code])
+        wh_df = chart_series[(selected_hub_id, product_type)]
+
+        fig = px.line(
+            wh_df,
+            x='Date', 
+            y='SO Quantity', 
+            color='WH ID',  
+            markers=True,
+            text='SO Quantity'
+        )
+        fig.update_traces(textposition="top center", textfont=dict(color="gray", size=11, weight="bold"))
+        fig.update_layout(margin=dict(t=10))  # Reduce top space for the chart
+
+        st.plotly_chart(fig, use_container_width=True)
     
         
         # Provide a download button for results
@@ -386,7 +256,7 @@ if so_file:
         
         # Place the select boxes in separate columns
         with col2:
-            selected_day = st.selectbox("Select D+X day(s)", [f"D+{i}" for i in range(1, 7)])
+            selected_day = st.selectbox("Select D+X day(s)", [f"D+{i}" for i in range(1, horizon + 1)])
         
         with col1:
             wh_options = final_results_df["WH ID"].unique().tolist()
@@ -401,7 +271,8 @@ if so_file:
         selected_columns = ["Hub ID", f"Updated Hub Qty {selected_day}", f"Predicted SO Qty {selected_day}", "Max Total Allocation", f"SO vs Reorder Point {selected_day}"]
         
         # Apply selection and styling
-        styled_df = filtered_df[selected_columns].style.applymap(highlight_triggered, subset=[f"SO vs Reorder Point {selected_day}"])
+        triggered = filtered_df[f"Triggered {selected_day}"].to_numpy()
+        styled_df = filtered_df[selected_columns].style.apply(lambda _: highlight_triggered(triggered), subset=[f"SO vs Reorder Point {selected_day}"])
     
         #styled_df = final_results_df.style.applymap(highlight_triggered, subset=[col for col in final_results_df.columns if "SO vs Reorder Point" in col])
 
@@ -420,8 +291,26 @@ if so_file:
                 
 
         
-        csv = final_results_df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download D+1 to D+6 SO Prediction", csv, "d1_d6_so_prediction.csv", "text/csv")
+        # Scenario mode: spread of SO qty under demand uncertainty for the selected WH and day
+        if so_file:
+            with st.expander("Demand Scenarios (Monte Carlo)"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    n_scenarios = st.number_input("Scenarios", min_value=100, max_value=5000, value=1000, step=100)
+                with col2:
+                    demand_cv = st.number_input("Demand CV (%)", min_value=0, max_value=100, value=20, step=5) / 100
+                with col3:
+                    run_scenarios = st.checkbox("Run scenarios")
+
+                if run_scenarios:
+                    scenario_df = simulate_so_scenarios(final_so_df, wh_demand, n_scenarios, demand_cv, seed=0, carry_over=carry_over)
+                    scenario_df = scenario_df[(scenario_df["WH ID"] == selected_wh) & (scenario_df["day"] == int(selected_day[2:]))]
+                    scenario_df = scenario_df.rename(columns={"hub_id": "Hub ID"})
+                    scenario_df["Trigger Probability"] = (scenario_df["Trigger Probability"] * 100).round(1).astype(str) + "%"
+                    st.dataframe(scenario_df[["Hub ID", "P10 SO Qty", "P50 SO Qty", "P90 SO Qty", "Trigger Probability"]].style.hide(axis="index"), use_container_width=True)
+
+        csv = final_results_df.drop(columns=trigger_cols).assign(**{"Hub Name": hub_name(hub_codes(final_results_df["Hub ID"]))}).to_csv(index=False).encode('utf-8')
+        st.download_button(f"Download D+1 to D+{horizon} SO Prediction", csv, f"d1_d{horizon}_so_prediction.csv", "text/csv")
 
 
 
@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+
+# Nightly results land in <BATCH_OUTPUT_DIR>/<run date>/
+BATCH_OUTPUT_DIR = "so_projection_output"
+NEXT_DAY_FILE = "next_day_so_prediction"
+PROJECTION_FILE = "so_projection_long"
+PRODUCT_PROJECTION_FILE = "product_so_projection"
+
+
+def batch_run_dir(run_date, out_dir=BATCH_OUTPUT_DIR):
+    return os.path.join(out_dir, str(run_date))
+
+
+def write_table(df, path, fmt):
+    if fmt == "csv":
+        df.to_csv(f"{path}.csv", index=False)
+    else:
+        df.to_parquet(f"{path}.parquet", index=False)
+
+
+def read_table(path):
+    if os.path.exists(f"{path}.parquet"):
+        return pd.read_parquet(f"{path}.parquet")
+    if os.path.exists(f"{path}.csv"):
+        return pd.read_csv(f"{path}.csv")
+    return None
+
+
+def batch_result_mtimes(run_date, out_dir=BATCH_OUTPUT_DIR):
+    # (path, mtime) of the result files a batch run wrote, so a rerun the same day is told apart
+    run_dir = batch_run_dir(run_date, out_dir)
+    paths = [os.path.join(run_dir, f"{name}.{ext}") for name in (NEXT_DAY_FILE, PROJECTION_FILE) for ext in ("parquet", "csv")]
+    return tuple((path, os.path.getmtime(path)) for path in paths if os.path.exists(path))
+
+
+def read_batch_results(run_date, out_dir=BATCH_OUTPUT_DIR):
+    # (next day frame, long D+1..D+N projection) written by a batch run, or None
+    run_dir = batch_run_dir(run_date, out_dir)
+    next_day_df = read_table(os.path.join(run_dir, NEXT_DAY_FILE))
+    projection_df = read_table(os.path.join(run_dir, PROJECTION_FILE))
+    if next_day_df is None or projection_df is None:
+        return None
+    return next_day_df, projection_df
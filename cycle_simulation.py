@@ -0,0 +1,145 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Days between two order cycles
+PERIOD_DAYS = 7
+
+FORECAST_KEYS = ["product_id", "location_id"]
+
+# Per-cycle metrics and dates of a CycleStore (dates in their order along the last axis)
+CYCLE_METRICS = ["avg_sales_future_cycle", "assumed_stock_wh", "assumed_ospo_qty", "rl_qty_amel", "landed_doi"]
+CYCLE_DATES = ["future_order_date", "future_inbound_date", "bisa_cover_sampai"]
+
+
+class CycleStore(NamedTuple):
+    # Simulated cycles of the SKU-location rows of orders (positionally indexed): metrics maps
+    # each CYCLE_METRICS name to a rows x cycles array (float32 when every value is a whole
+    # number, see narrow_metric), dates is a rows x cycles x CYCLE_DATES datetime64[D] array.
+    # Columns are only built for the cycle on screen (cycle_columns).
+    orders: pd.DataFrame
+    metrics: dict
+    dates: np.ndarray
+
+
+class HolidayShift(NamedTuple):
+    # Holiday upload as a lookup table: shifts[vendor_code, week] is the vendor's shifted
+    # datetime64[D] date for that cycle week, NaT where it is not shifted (week 0 never is).
+    # The last row is all NaT and is what vendors missing from the upload (code -1) land on.
+    vendors: pd.Index
+    shifts: np.ndarray
+
+
+def nan_to_zero(values):
+    # fillna(0) for arrays (infinities are kept, unlike np.nan_to_num)
+    return np.where(np.isnan(values), 0, values)
+
+
+def forecast_matrix(forecast_df, product_id, location_id, n_cycles):
+    # rows x (n_cycles + 1) weekly forecast for the given (product_id, location_id) rows, pivoted
+    # once from the upload's week columns ("1", "2", ...). Column i is cycle i; NaN where the
+    # file has no value (and in column 0, the current cycle has no forecast).
+    forecast = np.full((len(product_id), n_cycles + 1), np.nan)
+    if not set(FORECAST_KEYS) <= set(forecast_df.columns):
+        return forecast
+
+    weeks = pd.to_numeric(pd.Series(forecast_df.columns), errors="coerce")
+    week_cols = [(int(week), col) for col, week in zip(forecast_df.columns, weeks) if week in range(1, n_cycles + 1)]
+    first = ~forecast_df.duplicated(FORECAST_KEYS)
+    keys = pd.MultiIndex.from_frame(forecast_df.loc[first, FORECAST_KEYS])
+    pos = keys.get_indexer(pd.MultiIndex.from_arrays([product_id, location_id]))
+    found = pos >= 0
+
+    for week, col in week_cols:
+        values = pd.to_numeric(forecast_df.loc[first, col], errors="coerce").to_numpy(dtype=float)
+        forecast[found, week] = values[pos[found]]
+    return forecast
+
+
+def holiday_shift_table(holidays_df, n_cycles):
+    # HolidayShift from a holiday file with a row per vendor (primary_vendor_name) and one
+    # column per cycle week ("1", "2", ...); weeks past n_cycles are ignored
+    if "primary_vendor_name" not in holidays_df.columns:
+        return HolidayShift(pd.Index([]), np.full((1, n_cycles + 1), np.datetime64("NaT"), dtype="datetime64[D]"))
+
+    holidays_df = holidays_df[holidays_df["primary_vendor_name"].notna()].drop_duplicates("primary_vendor_name")
+    shifts = np.full((len(holidays_df) + 1, n_cycles + 1), np.datetime64("NaT"), dtype="datetime64[D]")
+    weeks = pd.to_numeric(pd.Series(holidays_df.columns), errors="coerce")
+    for col, week in zip(holidays_df.columns, weeks):
+        if week in range(1, n_cycles + 1):
+            shifts[:-1, int(week)] = pd.to_datetime(holidays_df[col], errors="coerce").to_numpy()
+    return HolidayShift(pd.Index(holidays_df["primary_vendor_name"]), shifts)
+
+
+def apply_holiday_shift(holiday_shift, vendor, dates):
+    # rows x cycles dates with each row's vendor's shifted dates taking over where there are
+    # some; one integer-indexed gather for all rows and cycles
+    shifted = holiday_shift.shifts[holiday_shift.vendors.get_indexer(vendor), :dates.shape[1]]
+    return np.where(np.isnat(shifted), dates, shifted)
+
+
+def simulate_cycles(stock_wh, ospo_qty, rl_qty, max_stock_wh, avg_sales, forecast, period_days=PERIOD_DAYS):
+    # Stock / OSPO / RL recurrence for every row and cycle, as rows x cycles arrays with
+    # cycle 0 the current state. Each cycle the forecast (avg_sales where there is none) is
+    # sold over period_days, the previous cycle's OSPO lands and its RL qty becomes the new OSPO.
+    n_rows, n_columns = forecast.shape
+    sales = np.where(np.isnan(forecast), avg_sales[:, None], forecast)
+    sales[:, 0] = avg_sales
+    usage = sales * period_days
+
+    stock = np.empty((n_rows, n_columns))
+    ospo = np.empty((n_rows, n_columns))
+    rl = np.empty((n_rows, n_columns))
+    stock[:, 0], ospo[:, 0], rl[:, 0] = stock_wh, ospo_qty, rl_qty
+
+    for i in range(1, n_columns):
+        stock[:, i] = np.round(np.clip(nan_to_zero(stock[:, i - 1] + ospo[:, i - 1] - usage[:, i]), 0, None))
+        ospo[:, i] = nan_to_zero(rl[:, i - 1])
+        rl[:, i] = np.round(np.clip(nan_to_zero(max_stock_wh - stock[:, i] - ospo[:, i]), 0, None))
+
+    # Days the landed stock lasts, 0 for rows without sales
+    with np.errstate(divide="ignore", invalid="ignore"):
+        landed = (stock + ospo - usage) / sales
+        landed_doi = np.round(np.clip(np.where(sales == 0, 0, landed), 0, None))
+        # The current cycle keeps the sales-average formula it always had (x / 0 is +-inf there)
+        landed_doi[:, 0] = np.clip(nan_to_zero(np.round(landed[:, 0])), 0, None)
+
+    return {
+        "avg_sales_future_cycle": sales,
+        "assumed_stock_wh": stock,
+        "assumed_ospo_qty": ospo,
+        "rl_qty_amel": rl,
+        "landed_doi": landed_doi,
+    }
+
+
+def narrow_metric(values):
+    # float32 copy of a metric whose values are all whole numbers (float32 holds those exactly
+    # up to 2**24, NaN / inf included); fractional metrics such as the sales averages stay float64
+    finite = values[np.isfinite(values)]
+    if np.array_equal(finite, np.round(finite)) and (np.abs(finite) <= 2 ** 24).all():
+        return values.astype(np.float32)
+    return values
+
+
+def cycle_store(orders, cycles):
+    # Pack simulate_cycles metrics and per-cycle dates (rows x cycles each) into a CycleStore,
+    # narrowed one metric at a time so no full-size float64 stack is built on the way
+    n_rows, n_cycles = cycles[CYCLE_METRICS[0]].shape
+    metrics = {name: narrow_metric(cycles[name]) for name in CYCLE_METRICS}
+    dates = np.empty((n_rows, n_cycles, len(CYCLE_DATES)), dtype="datetime64[D]")
+    for i, name in enumerate(CYCLE_DATES):
+        dates[:, :, i] = cycles[name]
+    # Shared between reruns (load_cycles caches the object itself), so nothing may write to it
+    for values in metrics.values():
+        values.flags.writeable = False
+    dates.flags.writeable = False
+    return CycleStore(orders.reset_index(drop=True), metrics, dates)
+
+
+def cycle_columns(store, cycle, rows=slice(None)):
+    # One cycle's metrics and dates as {name: array} for the given rows (all by default)
+    columns = {name: store.metrics[name][rows, cycle] for name in CYCLE_METRICS}
+    columns.update({name: store.dates[rows, cycle, i] for i, name in enumerate(CYCLE_DATES)})
+    return columns
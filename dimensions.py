@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Hub ID to Hub Name mapping
+HUB_NAMES = {
+    98: "MTG - Menteng",
+    121: "BS9 - Bintaro Sektor 9",
+    125: "PPN - Pos Pengumben",
+    152: "LBB - Lebak Bulus",
+    189: "SRP - Serpong Utara",
+    201: "MSB - Medan Satria Bekasi",
+    206: "JTB - Jatibening",
+    207: "GWB - Grand Wisata Bekasi",
+    223: "CT2 - Citra 2",
+    261: "CNR - Cinere",
+    288: "MRG - Margonda",
+    517: "FTW - Fatmawati",
+    523: "JLB - Jelambar",
+    529: "BSX - New BSD",
+    538: "KJT - Kramat Jati",  # Excluded
+    591: "MRY - Meruya",
+    615: "GPL - Gudang Peluru",
+    619: "TSY - Transyogi",
+    626: "DST - Duren Sawit",
+    634: "PPL - Panglima Polim",
+    648: "DNS - Danau Sunter",
+    654: "TGX - New TGC",
+    657: "APR - Ampera",
+    669: "BRY - Buncit Raya",
+    672: "KPM - Kapuk Muara",
+    759: "CWG - Cawang",  # Excluded
+    763: "PSG - Pisangan",
+    767: "PKC - Pondok Kacang",
+    773: "PGD - Pulo Gadung",
+    776: "BGS - Boulevard Gading Serpong"
+}
+
+# WH ID to WH Name mapping
+WH_NAMES = {
+    40: "KOS - WH Kosambi",
+    772: "STL - Sentul",
+    160: "PGS - Pegangsaan",
+    661: "CBN - WH Cibinong"
+}
+
+# Hubs and WHs left out of the SO projections
+EXCLUDED_HUBS = [537, 758]
+EXCLUDED_WHS = [583]
+
+# WHs behind each product type
+PRODUCT_TYPE_WHS = {"Dry": [772, 40], "Fresh": [160, 661]}
+
+# Dense codes are positions in these sorted id arrays. Ids outside the tables get the
+# extra last code (len(ids)), which has no name and is never excluded.
+HUB_IDS = np.array(sorted(set(HUB_NAMES) | set(EXCLUDED_HUBS)))
+WH_IDS = np.array(sorted(set(WH_NAMES) | set(EXCLUDED_WHS)))
+UNKNOWN_HUB = len(HUB_IDS)
+UNKNOWN_WH = len(WH_IDS)
+
+HUB_CODE_NAMES = np.array([HUB_NAMES.get(hub_id) for hub_id in HUB_IDS] + [None], dtype=object)
+WH_CODE_NAMES = np.array([WH_NAMES.get(wh_id) for wh_id in WH_IDS] + [None], dtype=object)
+
+# Precomputed masks, indexed by code
+EXCLUDED_HUB_MASK = np.append(np.isin(HUB_IDS, EXCLUDED_HUBS), False)
+EXCLUDED_WH_MASK = np.append(np.isin(WH_IDS, EXCLUDED_WHS), False)
+PRODUCT_TYPE_WH_MASK = {
+    product_type: np.append(np.isin(WH_IDS, wh_ids), False)
+    for product_type, wh_ids in PRODUCT_TYPE_WHS.items()
+}
+
+
+def encode_ids(ids, dim_ids):
+    # Dense int8 codes for ids against a sorted id array, unknown ids -> len(dim_ids)
+    ids = np.asarray(ids)
+    pos = np.searchsorted(dim_ids, ids)
+    pos_clipped = np.minimum(pos, len(dim_ids) - 1)
+    known = (pos < len(dim_ids)) & (dim_ids[pos_clipped] == ids)
+    return np.where(known, pos, len(dim_ids)).astype(np.int8)
+
+
+def hub_codes(hub_ids):
+    return encode_ids(hub_ids, HUB_IDS)
+
+
+def wh_codes(wh_ids):
+    return encode_ids(wh_ids, WH_IDS)
+
+
+def add_dim_codes(df, wh_col="wh_id", hub_col="hub_id"):
+    # Attach wh_code / hub_code columns used for grouping and filtering
+    df = df.copy()
+    df["wh_code"] = wh_codes(df[wh_col].to_numpy())
+    df["hub_code"] = hub_codes(df[hub_col].to_numpy())
+    return df
+
+
+def excluded_mask(df):
+    # Rows on an excluded hub or WH, from the precomputed masks
+    return EXCLUDED_HUB_MASK[df["hub_code"].to_numpy()] | EXCLUDED_WH_MASK[df["wh_code"].to_numpy()]
+
+
+def product_type_mask(df, product_type):
+    return PRODUCT_TYPE_WH_MASK[product_type][df["wh_code"].to_numpy()]
+
+
+def hub_name(codes):
+    return HUB_CODE_NAMES[np.asarray(codes)]
+
+
+def wh_name(codes):
+    return WH_CODE_NAMES[np.asarray(codes)]
+
+
+def hub_display(code):
+    # "<hub id> - <hub name>" label for selectboxes
+    return f"{HUB_IDS[code]} - {HUB_CODE_NAMES[code]}"
+
+
+def named_hub_codes(codes):
+    # Distinct codes of named hubs, in first-appearance order
+    codes = pd.unique(np.asarray(codes))
+    return [int(code) for code in codes if HUB_CODE_NAMES[code] is not None]
@@ -1,8 +1,16 @@
 import streamlit as st 
 import pandas as pd
 import datetime
+import hashlib
+import os
 import numpy as np
 import plotly.express as px
+from forecast_store import PRODUCT_FORECAST_FILE, load_product_forecast
+from so_projection import get_forecast_dates, prepare_so
+from inventory_position import build_inventory_position, guarded_merge, hub_in_transit, inventory_source_mtimes, wh_stock
+from product_incremental import project_product_so_incremental
+from product_projection import allocate_product_demand, projection_frame
+from dimensions import WH_CODE_NAMES, hub_codes, hub_name, wh_name
 
 #st.set_page_config(layout="wide") 
 
@@ -56,7 +64,11 @@ tab1, tab2 = st.tabs(["Next Day SO Prediction", "D+1 to D+6 SO Prediction"])
 #fresh_cbn_forecast_file = st.file_uploader("Upload Fresh CBN Demand Forecast CSV", type=["xlsx"])
 #fresh_pgs_forecast_file = st.file_uploader("Upload Fresh PGS Demand Forecast CSV", type=["xlsx"])
 
-dry_forecast_df = pd.read_excel("demand_dry_productid.xlsx")
+@st.cache_data
+def load_inventory_position(source_mtimes):
+    # Stock, stock in transit and open PO in one typed table, rebuilt when a source file changes
+    return build_inventory_position()
+
 
 if so_file:
     # Load Data
@@ -64,90 +76,39 @@ if so_file:
 
     
     # Get forecast dates D+1 to D+6
-    dry_forecast_df['date_key'] = pd.to_datetime(dry_forecast_df['date_key'], errors='coerce')
-    forecast_dates = [(today + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(1, 7)]
+    forecast_dates = get_forecast_dates(today, 6)
     
-    # Filter forecast data for D+1 to D+6
-    dry_forecast_df = dry_forecast_df[dry_forecast_df["date_key"].isin(forecast_dates)]
-
-    # Convert IDs to integer type
-    final_so_df[['wh_id','product_id', 'hub_id']] = final_so_df[['wh_id','product_id', 'hub_id']].apply(pd.to_numeric)
+    # Dry product forecast for D+1 to D+6 only, read from its parquet copy
+    dry_forecast_df = load_product_forecast(forecast_dates)
 
-    # Exclude specific hubs
-    final_so_df["hub_id"] = final_so_df["hub_id"].astype(int)
-    final_so_df = final_so_df[~final_so_df['hub_id'].isin([537, 758])]
-    final_so_df = final_so_df[~final_so_df['wh_id'].isin([583])]
+    # Convert IDs to integer type, attach hub/WH codes and exclude specific hubs
+    final_so_df = prepare_so(final_so_df, id_cols=['wh_id', 'product_id', 'hub_id'])
 
-     # Hub ID to Hub Name mapping
-    hub_name_mapping = {
-        98: "MTG - Menteng",
-        121: "BS9 - Bintaro Sektor 9",
-        125: "PPN - Pos Pengumben",
-        152: "LBB - Lebak Bulus",
-        189: "SRP - Serpong Utara",
-        201: "MSB - Medan Satria Bekasi",
-        206: "JTB - Jatibening",
-        207: "GWB - Grand Wisata Bekasi",
-        223: "CT2 - Citra 2",
-        261: "CNR - Cinere",
-        288: "MRG - Margonda",
-        517: "FTW - Fatmawati",
-        523: "JLB - Jelambar",
-        529: "BSX - New BSD",
-        538: "KJT - Kramat Jati",  # Excluded
-        591: "MRY - Meruya",
-        615: "GPL - Gudang Peluru",
-        619: "TSY - Transyogi",
-        626: "DST - Duren Sawit",
-        634: "PPL - Panglima Polim",
-        648: "DNS - Danau Sunter",
-        654: "TGX - New TGC",
-        657: "APR - Ampera",
-        669: "BRY - Buncit Raya",
-        672: "KPM - Kapuk Muara",
-        759: "CWG - Cawang",  # Excluded
-        763: "PSG - Pisangan",
-        767: "PKC - Pondok Kacang",
-        773: "PGD - Pulo Gadung",
-        776: "BGS - Boulevard Gading Serpong"
-    }
+    # Row counts and duplicate source rows of every inventory join, shown in the sidebar
+    join_report = []
 
-    # WH ID to WH Name mapping
-    wh_name_mapping = {
-        40: "KOS - WH Kosambi",
-        772: "STL - Sentul",
-        160: "PGS - Pegangsaan",
-        661: "CBN - WH Cibinong"
-    }
-
-    stock_df1 = pd.read_excel('kos.xlsx')
-    stock_df2 = pd.read_excel('stl.xlsx')
-    
-    # Concatenate the stock data from both files (assuming they have the same structure)
-    stock_df = pd.concat([stock_df1, stock_df2])
+    # A bad inventory extract (duplicate stock / SIT keys, a join that would fan out) stops the
+    # page with the reason instead of a traceback
+    try:
+        # Stock, stock in transit and open PO per (wh_id, hub_id, product_id), loaded once
+        source_mtimes = inventory_source_mtimes()
+        inventory_position = load_inventory_position(source_mtimes)
     
-    # Merge the stock data with the final SO data on 'product_id'
-    final_so_df = final_so_df.merge(stock_df, on='product_id', how='left')
+        # Merge the on-hand WH stock with the final SO data on (wh_id, product_id)
+        final_so_df = guarded_merge(final_so_df, wh_stock(inventory_position, include_po=False), "stock",
+                                    fill_value=None, report=join_report)
 
-    # Load Stock in Transit to Hub
-    stock_in_transit_df = pd.read_excel('sit.xlsx')
-    
-    # Merge stock in transit with the final SO DataFrame
-    final_so_df = final_so_df.merge(stock_in_transit_df, on=['wh_id', 'hub_id'], how='left')
-    final_so_df['quantity'] = final_so_df['quantity'].fillna(0)
+        # Merge stock in transit with the final SO DataFrame on (wh_id, hub_id, product_id)
+        final_so_df = guarded_merge(final_so_df, hub_in_transit(inventory_position), "stock in transit", report=join_report)
+    except (pd.errors.MergeError, ValueError, KeyError) as e:
+        st.error(f"❌ Error joining the inventory extracts: {e}")
+        st.stop()
 
     # Add stock in transit to the hub quantity
-    final_so_df['Sum of hub_qty'] += final_so_df['quantity']
-    
-    # Load Incoming Stock to WH
-    incoming_ospo = pd.read_excel('ospo.xlsx')
+    final_so_df['Sum of hub_qty'] += final_so_df['in_transit']
     
-    # Merge incoming stock with the stock DataFrame
-    stock_df = stock_df.merge(incoming_ospo, on=['wh_id', 'product_id'], how='left')
-    stock_df['quantity_po'] = stock_df['quantity_po'].fillna(0)
-    
-    # Update the stock quantity by adding incoming stock
-    stock_df['stock'] += stock_df['quantity_po']
+    # WH stock including incoming stock (open PO)
+    stock_df = wh_stock(inventory_position)
 
     with tab1:
         #st.subheader("Next Day SO Prediction")
@@ -157,19 +118,18 @@ if so_file:
                                                final_so_df['Sum of multiplier']) * final_so_df['Sum of multiplier']
         final_so_df['Predicted SO Qty D+0'] = final_so_df['Predicted SO Qty D+0'].clip(lower=0).astype(int)
     
-        final_so_df["WH Name"] = final_so_df["wh_id"].map(wh_name_mapping)
-        final_so_df["Hub Name"] = final_so_df["hub_id"].map(hub_name_mapping)
         final_so_df = final_so_df.rename(columns={"wh_id": "WH ID"})
 
         def highlight_final_so(s):
             return ['background-color: #FFFACD' if s.name == 'Sum of qty_so_final' else '' for _ in s]
 
         # Create a WH-level aggregated DataFrame
-        wh_summary_df = final_so_df.groupby("WH Name").agg({
+        wh_summary_df = final_so_df.groupby("wh_code").agg({
         'Sum of qty_so': 'sum',
         'Predicted SO Qty D+0': 'sum',
         'Sum of qty_so_final': 'sum'
         }).reset_index()
+        wh_summary_df.insert(0, "WH Name", wh_name(wh_summary_df.pop("wh_code")))
         
         # Apply styling
         styled_wh_summary = wh_summary_df.style.apply(highlight_final_so, subset=["Sum of qty_so_final"])
@@ -180,11 +140,12 @@ if so_file:
         
         # Select WH dropdown
         st.markdown('<h4 style="color: maroon;">Summary by Hub</h4>', unsafe_allow_html=True)
-        wh_options = final_so_df["WH Name"].unique().tolist()
-        selected_wh = st.selectbox("Select WH", wh_options)
+        wh_options = pd.unique(final_so_df["wh_code"]).tolist()
+        selected_wh_code = st.selectbox("Select WH", wh_options, format_func=lambda code: WH_CODE_NAMES[code])
         
-        # Filter DataFrame by selected WH
-        filtered_so_df = final_so_df[final_so_df["WH Name"] == selected_wh]
+        # Filter DataFrame by selected WH, hub names attached to the filtered rows only
+        filtered_so_df = final_so_df[final_so_df["wh_code"] == selected_wh_code].copy()
+        filtered_so_df["Hub Name"] = hub_name(filtered_so_df["hub_code"])
         
         # Apply styling to filtered DataFrame
         styled_filtered_so = filtered_so_df[["Hub Name", "Sum of qty_so", "Sum of qty_so_final", "Predicted SO Qty D+0"]].style.apply(
@@ -197,88 +158,30 @@ if so_file:
     
     with tab2:
             
-        # Initialize result DataFrame
-        results = []
-
-        dry_forecast_df = dry_forecast_df.merge(final_so_df[['product_id', 'WH ID']], on='product_id', how='left')
-        
-        for day, forecast_date in enumerate(forecast_dates, start=1):
-            for product_id in dry_forecast_df["product_id"].unique():
-                # Get the daily dry forecast for the given date and product ID
-                daily_dry_forecast = dry_forecast_df[
-                    (dry_forecast_df["date_key"] == forecast_date) & 
-                    (dry_forecast_df["product_id"] == product_id)
-                ]["Forecast Step 3"].sum()
-        
-                # Get unique product IDs for WH 40 and WH 772
-                wh_40_products = set(dry_forecast_df[dry_forecast_df["WH ID"] == 40]["product_id"].unique())
-                wh_772_products = set(dry_forecast_df[dry_forecast_df["WH ID"] == 772]["product_id"].unique())
-                
-                # Determine product IDs that are associated with both WHs
-                common_products = wh_40_products.intersection(wh_772_products)
-        
-                # Allocate Demand Forecast to WHs
-                if product_id in common_products:
-                    dry_demand_allocation_split = {
-                        772: int(daily_dry_forecast * 0.62),
-                        40: int(daily_dry_forecast * 0.38)
-                    }
-                elif product_id in wh_40_products:
-                    dry_demand_allocation_split = {40: int(daily_dry_forecast)}
-                elif product_id in wh_772_products:
-                    dry_demand_allocation_split = {772: int(daily_dry_forecast)}
-                else:
-                    dry_demand_allocation_split = {}
-        
-                # Log the allocation for debugging
-                #st.write(f"Day {day}, Product {product_id}, Allocation: {dry_demand_allocation_split}")
-                    
-            daily_result = final_so_df.copy()
-            daily_result[f'Updated Hub Qty D+{day}'] = daily_result['Sum of hub_qty']
-            
-            # Iterate through each WH ID and Hub ID
-            for wh_id in final_so_df['WH ID'].unique():
-                for hub_id in final_so_df.loc[final_so_df['WH ID'] == wh_id, 'hub_id'].unique():
-                    hub_mask = (daily_result['WH ID'] == wh_id) & (daily_result['hub_id'] == hub_id)
-                    total_so_final = final_so_df.loc[final_so_df['WH ID'] == wh_id, 'Sum of qty_so_final'].sum()
-            
-                    if total_so_final > 0:
-                        hub_forecast = ((final_so_df.loc[hub_mask, 'Sum of qty_so_final'] / total_so_final) * 
-                                        (dry_demand_allocation_split.get(wh_id, 0)).astype(int))
-                    else:
-                        hub_forecast = 0
-            
-                    daily_result.loc[hub_mask, f'Updated Hub Qty D+{day}'] -= hub_forecast
-                    daily_result.loc[hub_mask, f'Updated Hub Qty D+{day}'] = daily_result.loc[hub_mask, f'Updated Hub Qty D+{day}'].clip(lower=0)
-            
-            # Compute Predicted SO Quantity
-            daily_result[f'Predicted SO Qty D+{day}'] = (
-                (daily_result['Sum of maxqty'] - daily_result[f'Updated Hub Qty D+{day}']) / 
-                daily_result['Sum of multiplier']
-            ) * daily_result['Sum of multiplier']
-            
-            # Adjust Predicted SO Quantity based on stock availability
-            # Merge daily_result with stock_df to add the 'stock' column
-            daily_result = daily_result.merge(stock_df[['product_id', 'stock']], on='product_id', how='left')
-            
-            # Set Predicted SO Qty to NaN if stock is less than the predicted quantity
-            daily_result.loc[daily_result['stock'] < daily_result[f'Predicted SO Qty D+{day}'], f'Predicted SO Qty D+{day}'] = np.nan
-
-            print(daily_result[[f'Predicted SO Qty D+{day}', 'stock']])
-            
-            #daily_result.loc[daily_result['WH ID'] == 40, f'Predicted SO Qty D+{day}'] *= 0.71
-            #daily_result.loc[daily_result['WH ID'] == 772, f'Predicted SO Qty D+{day}'] *= 0.535
-            
-            daily_result = daily_result.rename(columns={"wh_id": "WH ID", "hub_id": "Hub ID"})
-            results.append(daily_result[["WH ID", "Hub ID", "product_id", "Sum of maxqty", f"Updated Hub Qty D+{day}", f"Predicted SO Qty D+{day}"]])
-        
-        # Merge results into a single DataFrame
-        final_results_df = results[0]
-        for df in results[1:]:
-            final_results_df = final_results_df.merge(df, on=["WH ID", "Hub ID","product_id", "Sum of maxqty"], how="left")
-            
-        #final_results_df["WH Name"] = final_results_df["wh_id"].map(wh_name_mapping)
-        
+        # The projection is kept per upload, day, product forecast and inventory snapshot: reruns
+        # of the same upload reuse it and its diff, a new upload only recomputes the rows whose
+        # inputs changed since the last one
+        upload_key = (hashlib.md5(so_file.getvalue()).hexdigest(), today, os.path.getmtime(PRODUCT_FORECAST_FILE),
+                      source_mtimes)
+        stored = st.session_state.get("drykhusus_projection")
+        if stored is None or stored["upload"] != upload_key:
+            # Dry demand per (product, WH, day), spread to hubs and projected for all days at once
+            product_demand = allocate_product_demand(dry_forecast_df, final_so_df, forecast_dates)
+            # WH stock (incl. incoming PO) handed out to hubs in priority order, each day
+            previous_state = stored["state"] if stored else None
+            projection, state, recomputed, changed_hubs = project_product_so_incremental(
+                final_so_df, product_demand, previous_state, wh_stock=stock_df["stock"]
+            )
+            stored = st.session_state["drykhusus_projection"] = {
+                "upload": upload_key, "state": state, "projection": projection,
+                "recomputed": recomputed if previous_state is not None else None, "changed_hubs": changed_hubs,
+            }
+        projection = stored["projection"]
+        if stored["recomputed"] is not None:
+            changed_hub_names = [f"{hub_id} - {name}" if name else str(hub_id)
+                                 for hub_id, name in zip(stored["changed_hubs"], hub_name(hub_codes(stored["changed_hubs"])))]
+            st.caption(f"Recomputed {stored['recomputed'].sum():,} of {len(stored['recomputed']):,} rows since the last upload. "
+                       f"Hubs with changes: {', '.join(changed_hub_names) or 'none'}")
 
          # Create two columns for better layout
         col1, col2 = st.columns(2)
@@ -288,19 +191,26 @@ if so_file:
             selected_day = st.selectbox("Select D+X day(s)", [f"D+{i}" for i in range(1, 7)])
         
         with col1:
-            wh_options = final_results_df["WH ID"].unique().tolist()
+            wh_options = projection.wh_ids.tolist()
             selected_wh = st.selectbox("Select WH ID", wh_options)
         
-        # Filter the dataframe based on selected WH
-        
-        final_results_df = final_results_df.rename(columns={"Sum of maxqty": "Max Total Allocation"})
-        filtered_df = final_results_df[final_results_df["WH ID"] == selected_wh]
+        # Only the selected WH and day are turned into a DataFrame
+        filtered_df = projection_frame(projection, wh_id=selected_wh, day=int(selected_day[2:]))
+        filtered_df = filtered_df.rename(columns={"Sum of maxqty": "Max Total Allocation"})
         
         # Select relevant columns dynamically based on the chosen day
-        selected_columns = ["Hub ID","product_id", f"Updated Hub Qty {selected_day}", f"Predicted SO Qty {selected_day}", "Max Total Allocation"]
+        selected_columns = ["Hub ID","product_id", f"Updated Hub Qty {selected_day}", f"Predicted SO Qty {selected_day}",
+                            f"Allocated SO Qty {selected_day}", "Max Total Allocation"]
+        
+        # Highlight hubs the WH stock cannot fully cover
+        def highlight_short(allocated, predicted):
+            return np.where(allocated < predicted, 'background-color: lightcoral', '')
         
         # Apply selection and styling
-        styled_df = filtered_df[selected_columns].style.applymap(highlight_triggered, subset=[f"SO vs Reorder Point {selected_day}"])
+        styled_df = filtered_df[selected_columns].style.apply(
+            lambda allocated: highlight_short(allocated, filtered_df[f"Predicted SO Qty {selected_day}"]),
+            subset=[f"Allocated SO Qty {selected_day}"]
+        )
     
         #styled_df = final_results_df.style.applymap(highlight_triggered, subset=[col for col in final_results_df.columns if "SO vs Reorder Point" in col])
 
@@ -317,5 +227,12 @@ if so_file:
         
         st.metric(label="Total Predicted SO Qty", value=f"{predicted_so_sum:,.0f}")
         
-        csv = final_results_df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download D+1 to D+6 SO Prediction", csv, "d1_d6_so_prediction.csv", "text/csv")
+        # The full-assortment table is only built when the download is clicked
+        def projection_csv():
+            final_results_df = projection_frame(projection).rename(columns={"Sum of maxqty": "Max Total Allocation"})
+            return final_results_df.to_csv(index=False).encode('utf-8')
+
+        st.download_button("Download D+1 to D+6 SO Prediction", projection_csv, "d1_d6_so_prediction.csv", "text/csv")
+
+    with st.sidebar.expander("Inventory join row counts"):
+        st.dataframe(pd.DataFrame(join_report), hide_index=True)
@@ -0,0 +1,150 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Parquet copies of the forecast workbooks, one file per workbook version
+CACHE_DIR = ".forecast_cache"
+
+# Rows per parquet row group. Files are sorted by date_key, so a group covers about one
+# day of the product-level forecast and date filters skip the other groups via min/max stats.
+ROW_GROUP_SIZE = 1 << 14
+
+
+def file_fingerprint(path):
+    # Content hash of the source workbook, so an edited file gets a fresh parquet copy
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def forecast_parquet_path(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}.{file_fingerprint(path)}.parquet")
+
+
+def convert_forecast(path, parquet_path):
+    # One-time xlsx -> parquet conversion with typed columns, sorted by date_key
+    df = pd.read_excel(path)
+    df = df.loc[:, ~df.columns.astype(str).str.startswith("Unnamed")]
+
+    df["date_key"] = pd.to_datetime(df["date_key"], errors="coerce").dt.normalize()
+    df["Forecast Step 3"] = pd.to_numeric(df["Forecast Step 3"], errors="coerce").fillna(0).astype("float64")
+    df = df.dropna(subset=["date_key"])
+    if "product_id" in df:
+        # Product-level forecasts: numeric ids, rows without a usable id dropped
+        df["product_id"] = pd.to_numeric(df["product_id"], errors="coerce")
+        df = df.dropna(subset=["product_id"]).astype({"product_id": "int64"})
+    df = df.sort_values("date_key", kind="stable").reset_index(drop=True)
+
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    tmp_path = parquet_path + ".tmp"
+    df.to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, parquet_path)
+
+    # Drop parquet copies of older versions of the same workbook
+    stem = os.path.basename(parquet_path).rsplit(".", 2)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(parquet_path), f"{glob.escape(stem)}.*.parquet")):
+        if stale != parquet_path:
+            os.remove(stale)
+
+
+def forecast_parquet(path, cache_dir=CACHE_DIR):
+    # Path of the workbook's parquet copy, converting it first when needed
+    parquet_path = forecast_parquet_path(path, cache_dir)
+    if not os.path.exists(parquet_path):
+        convert_forecast(path, parquet_path)
+    return parquet_path
+
+
+def load_forecast(path, dates=None, columns=None, cache_dir=CACHE_DIR):
+    # Read a forecast workbook through its parquet copy, only for the requested dates
+    parquet_path = forecast_parquet(path, cache_dir)
+
+    filters = None
+    if dates is not None:
+        filters = [("date_key", "in", list(pd.to_datetime(list(dates))))]
+
+    return pd.read_parquet(parquet_path, columns=columns, filters=filters)
+
+
+# Dry forecast per product, read for the product-level projections
+PRODUCT_FORECAST_FILE = "demand_dry_productid.xlsx"
+PRODUCT_FORECAST_COLUMNS = ["product_id", "date_key", "Forecast Step 3"]
+
+
+def load_product_forecast(dates, path=PRODUCT_FORECAST_FILE, cache_dir=CACHE_DIR):
+    # Only the forecast dates and the columns the projection uses
+    return load_forecast(path, dates=dates, columns=PRODUCT_FORECAST_COLUMNS, cache_dir=cache_dir)
+
+
+# Forecast workbooks by product type, one workbook per month
+FORECAST_SOURCES = {
+    "Dry": "Forecast * Dry.xlsx",
+    "Fresh CBN": "Forecast * Fresh CBN.xlsx",
+    "Fresh PGS": "Forecast * Fresh PGS.xlsx",
+}
+CUBE_FILE = "forecast_cube.parquet"
+CUBE_MANIFEST_FILE = "forecast_cube.json"
+
+
+def forecast_source_files(sources=FORECAST_SOURCES):
+    # (product type, workbook path) for every monthly workbook on disk
+    return [(source, path) for source, pattern in sources.items() for path in sorted(glob.glob(pattern))]
+
+
+def build_forecast_cube(sources=FORECAST_SOURCES, cache_dir=CACHE_DIR):
+    # Daily forecast totals as a dense date x product type frame (full daily index, 0 where
+    # no workbook covers the date). Per-workbook totals are persisted, so only workbooks
+    # that are new or changed since the last build are read again.
+    cube_path = os.path.join(cache_dir, CUBE_FILE)
+    manifest_path = os.path.join(cache_dir, CUBE_MANIFEST_FILE)
+
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    totals = pd.read_parquet(cube_path) if os.path.exists(cube_path) and manifest else None
+
+    files = forecast_source_files(sources)
+    fingerprints = {path: file_fingerprint(path) for _, path in files}
+    stale = [path for path in fingerprints if manifest.get(path) != fingerprints[path]]
+    stale += [path for path in manifest if path not in fingerprints]
+
+    if totals is None or stale:
+        parts = [] if totals is None else [totals[~totals["file"].isin(stale)]]
+        for source, path in files:
+            if totals is None or path in stale:
+                forecast_df = load_forecast(path, cache_dir=cache_dir)
+                daily = forecast_df.groupby("date_key", as_index=False)["Forecast Step 3"].sum()
+                parts.append(daily.assign(source=source, file=path))
+        totals = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+            {"date_key": pd.DatetimeIndex([]), "Forecast Step 3": [], "source": [], "file": []})
+
+        os.makedirs(cache_dir, exist_ok=True)
+        totals.to_parquet(cube_path, index=False)
+        with open(manifest_path, "w") as f:
+            json.dump(fingerprints, f)
+
+    if totals.empty:
+        return pd.DataFrame(columns=list(sources), index=pd.DatetimeIndex([], name="date_key"), dtype=float)
+
+    cube = totals.pivot_table(index="date_key", columns="source", values="Forecast Step 3", aggfunc="sum")
+    cube = cube.reindex(pd.date_range(cube.index.min(), cube.index.max(), freq="D", name="date_key"))
+    return cube.reindex(columns=list(sources)).fillna(0)
+
+
+def forecast_cube_slice(cube, dates):
+    # days x product type array for the given dates, looked up by position in the daily index
+    values = np.zeros((len(dates), cube.shape[1]))
+    if cube.empty:
+        return values
+    offsets = (pd.to_datetime(list(dates)) - cube.index[0]).days.to_numpy()
+    covered = (offsets >= 0) & (offsets < len(cube))
+    values[covered] = cube.to_numpy()[offsets[covered]]
+    return values
@@ -1,346 +1,189 @@
 import pandas as pd
 import numpy as np
 import streamlit as st
+import hashlib
 import re
 
-# Load Excel Data
-@st.cache_data
-def load_data(file_path):
-    return pd.read_excel(file_path)
+from cycle_simulation import (CYCLE_DATES, CYCLE_METRICS, PERIOD_DAYS, apply_holiday_shift, cycle_columns, cycle_store,
+                              forecast_matrix, holiday_shift_table, simulate_cycles)
 
-# Function to calculate JI, Max Stock WH, RL Qty New, Assumed Stock WH for future cycles, and Assumed OSPO Qty
-import pandas as pd
-import numpy as np
-import re
+# Cycles the planner can pick from; all of them are simulated in one go per set of uploads
+NUM_CYCLES = 14
+
+# Simulated cycle stores held in memory (one per set of uploads) and for how long
+CYCLE_CACHE_ENTRIES = 4
+CYCLE_CACHE_TTL = "12h"
+
+# Dates stay datetime64 through the calculation and are only formatted for display
+DATE_FORMAT = '%d-%b-%Y'
+
+# bisa_cover_sampai label (instead of a date) for rows whose selected cycle lands at 0 DOI
+COVER_STATUS_OOS = 'currently oos wh'
+COVER_STATUS_SHORT = 'tambah coverage/qty'
 
-def calculate_columns(df, cycle, frequency_df, forecast_df, order_holidays_df, inbound_holidays_df):
-    # Convert date columns
+
+def read_upload(file, empty_columns=None):
+    # CSV or Excel upload; an empty frame with empty_columns (or None) when nothing was uploaded
+    if file is None:
+        return pd.DataFrame(columns=empty_columns) if empty_columns is not None else None
+    return pd.read_csv(file) if file.name.endswith('.csv') else pd.read_excel(file)
+
+
+def format_dates(df):
+    # Display copy of a frame with every datetime column as a DATE_FORMAT string, the one
+    # place dates are turned into text. A cover_status column replaces bisa_cover_sampai
+    # where it is set.
+    df = df.copy()
+    for col in df.columns[[pd.api.types.is_datetime64_any_dtype(dtype) for dtype in df.dtypes]]:
+        df[col] = df[col].dt.strftime(DATE_FORMAT)
+    if 'cover_status' in df.columns:
+        df['bisa_cover_sampai'] = df.pop('cover_status').fillna(df['bisa_cover_sampai'])
+    return df
+
+
+def prepare_orders(df):
+    # Typed dates and quantities, JI / coverage days and max stock WH per SKU-location
     df['next_coverage_date'] = pd.to_datetime(df['next_coverage_date'], errors='coerce')
     df['next_order_date'] = pd.to_datetime(df['next_order_date'], errors='coerce')
     df['next_inbound_date'] = pd.to_datetime(df['next_inbound_date'], errors='coerce')
 
     for col in ['avg_sales_final', 'doi_policy', 'stock_wh', 'ospo_qty', 'ospr_qty', 'osrl_qty']:
         df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-    
+
     # JI and coverage
     df['cov'] = (df['next_coverage_date'] - df['next_order_date']).dt.days.clip(lower=0, upper=1000)
     df['JI'] = (df['next_inbound_date'] - df['next_order_date']).dt.days.clip(lower=0, upper=1000)
     df['max_stock_wh'] = df['avg_sales_final'] * (df['doi_policy'] + df['cov'])
-    
-    # Get cycle number from string
-    match = re.search(r'Cycle\s*(\d+)', cycle)
-    cycle_num = int(match.group(1)) if match else 0
-    
-    # Create base columns for current cycle
-    df['cycle_order_date'] = df['next_order_date'].dt.normalize()
-    df['cycle_inbound_date'] = df['next_inbound_date'].dt.normalize()# + pd.to_timedelta(df['JI'], unit='D')
-    df['cycle_coverage_date'] = df['next_coverage_date']# + pd.to_timedelta(df['cov'], unit='D')
-    
-    # Now loop to shift the dates by 7 days per cycle number
-    if cycle_num > 0:
-        df['cycle_order_date'] = pd.to_datetime(df['cycle_order_date'] + pd.to_timedelta(7 * cycle_num, unit='D')).dt.normalize()
-        df['cycle_inbound_date'] = pd.to_datetime(df['cycle_inbound_date'] + pd.to_timedelta(7 * cycle_num, unit='D')).dt.normalize()
-        df['cycle_coverage_date'] = df['cycle_coverage_date'] + pd.to_timedelta(7 * cycle_num, unit='D')
-
-    # Final formatting
-    df['period_days'] = 7  
-    df['future_order_date'] = pd.to_datetime(df['cycle_order_date'], errors='coerce')#.dt.strftime('%d-%b-%Y')
-    df['future_inbound_date'] =  pd.to_datetime(df['cycle_inbound_date'], errors='coerce')#.dt.strftime('%d-%b-%Y')
-    df['future_coverage_date'] = df['cycle_coverage_date'].dt.strftime('%d-%b-%Y')
-    df['future_order_date2'] = pd.to_datetime(df['future_order_date'], errors='coerce')
-
-    #order_holidays_df['future_order_date_new'] = pd.to_datetime(order_holidays_df['future_order_date_new'], errors='coerce')
-    #inbound_holidays_df['future_inbound_date_new'] = pd.to_datetime(inbound_holidays_df['future_inbound_date_new'], errors='coerce')
-
-    order_shift = order_holidays_df.melt(
-    id_vars=['primary_vendor_name'],
-    var_name='week',
-    value_name='order_shift_week'
+    df['period_days'] = PERIOD_DAYS
+    return df
+
+
+def simulate_all_cycles(df, forecast_df, order_shift, inbound_shift, n_cycles=NUM_CYCLES):
+    # Every cycle from Current (0) to n_cycles, simulated once into a CycleStore. Picking a
+    # cycle is then a slice of its arrays.
+    df = prepare_orders(df)
+
+    # Forecast pivoted once into rows x weeks, then stock / OSPO / RL for all cycles at once.
+    # Cycle 0 (Current) starts from today's stock, OSPO and the original RL qty.
+    forecast = forecast_matrix(forecast_df, df['product_id'].to_numpy(), df['location_id'].to_numpy(), n_cycles)
+    cycles = simulate_cycles(
+        df['stock_wh'].to_numpy(dtype=float),
+        df['ospo_qty'].to_numpy(dtype=float),
+        pd.to_numeric(df['original rl_qty'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        df['max_stock_wh'].to_numpy(dtype=float),
+        df['avg_sales_final'].to_numpy(dtype=float),
+        forecast,
+        period_days=PERIOD_DAYS,
     )
 
-    order_shift['week'] = pd.to_numeric(order_shift['week'], errors='coerce').fillna(0).astype(int)
-    
-    # Choose how many cycles to run based on Streamlit dropdown
-    selected_cycle1 = int(cycle.split()[-1]) if cycle.startswith('Cycle') else 0
-    start1 = 1
-    end1 = selected_cycle1 + 1
-
-    # Loop from Cycle 1 up to selected cycle
-    for i in range(start1, end1):
-        temp = df[['primary_vendor_name']].copy()
-        temp['week'] = i
-    
-        merged = temp.merge(order_shift, on=['primary_vendor_name', 'week'], how='left')
-
-    
-        # Overwrite only where forecast is available
-        df.loc[merged['order_shift_week'].notna(), f'future_order_date_{i}'] = merged['order_shift_week']
-        
-    col_name = f'future_order_date_{selected_cycle1}'
-
-    if col_name in df.columns:
-        col_data = pd.to_datetime(df[col_name], errors='coerce')
-        st.write("Sample values in future_order_date column:")
-        st.write(col_data.head())
-        st.write("Column dtype:", col_data.dtype)
-    
-        df['cycle_order_date'] = pd.to_datetime(df['cycle_order_date'], errors='coerce').dt.strftime('%d-%b-%Y')
-        df['future_order_date'] = col_data.combine_first(df['cycle_order_date']).dt.strftime('%d-%b-%Y')
-    else:
-        df['future_order_date'] = pd.to_datetime(df['cycle_order_date'], errors='coerce').dt.strftime('%d-%b-%Y')
-        
-    df['future_order_date'] = pd.to_datetime(df['future_order_date'], errors='coerce').dt.strftime('%d-%b-%Y')
-        
+    # Order / inbound dates move a week per cycle unless the vendor's holiday file shifts them
+    weeks = np.arange(n_cycles + 1) * np.timedelta64(7, 'D')
+    order_dates = df['next_order_date'].to_numpy().astype('datetime64[D]')[:, None] + weeks
+    inbound_dates = df['next_inbound_date'].to_numpy().astype('datetime64[D]')[:, None] + weeks
+    cycles['future_order_date'] = apply_holiday_shift(order_shift, df['primary_vendor_name'], order_dates)
+    cycles['future_inbound_date'] = apply_holiday_shift(inbound_shift, df['primary_vendor_name'], inbound_dates)
+
+    # Coverage date: JI per cycle on top of the next coverage date plus the minimum JI required
+    # to ensure Landed DOI >= 1 (min_JI_<cycle> when the upload has it). Current covers 2 JIs
+    # from the next order date.
+    ji = df['JI'].to_numpy(dtype=float)
+    cover_days = ji[:, None] * np.arange(n_cycles + 1)
+    for i in range(1, n_cycles + 1):
+        if f'min_JI_{i}' in df.columns:
+            cover_days[:, i] += pd.to_numeric(df[f'min_JI_{i}'], errors='coerce').fillna(0).clip(lower=0, upper=1000).to_numpy()
+    cover_days[:, 0] = 2 * ji
+    cover_from = np.repeat(df['next_coverage_date'].to_numpy()[:, None], n_cycles + 1, axis=1)
+    cover_from[:, 0] = df['next_order_date'].to_numpy()
+    # Fractional days (min_JI) to nanoseconds; NaN JI (no dates) becomes NaT
+    cover_offset = (cover_days * 86_400e9).astype('timedelta64[ns]')
+    cycles['bisa_cover_sampai'] = (cover_from + cover_offset).astype('datetime64[D]')
+
+    return cycle_store(df, cycles)
+
+
+def cycle_frame(store, selected_cycle):
+    # Order frame with the selected cycle's metrics (float64 for the totals) and datetime64 dates
+    df = store.orders.copy()
+    columns = cycle_columns(store, selected_cycle)
+    for name in CYCLE_METRICS:
+        df[name] = columns[name].astype(float)
+    for name in CYCLE_DATES:
+        df[name] = columns[name]
+
+    # Rows landing at 0 DOI show a status instead of the coverage date: "currently oos wh"
+    # when the WH stock is gone too, "tambah coverage/qty" when there is still stock
+    df['landed_doi'] = df['landed_doi'].replace(np.nan,0)
+    no_doi = df['landed_doi'] == 0
+    df['cover_status'] = np.where(no_doi, np.where(df['assumed_stock_wh'] == 0, COVER_STATUS_OOS, COVER_STATUS_SHORT), None)
+    return df
 
 
-    #INBOUND
-    inbound_shift = inbound_holidays_df.melt(
-    id_vars=['primary_vendor_name'],
-    var_name='week',
-    value_name='inbound_shift_week'
-    )
+def show_cycle_summaries(df, store, selected_cycle, frequency_df):
+    # Totals and vendor summary tables for the selected cycle; returns the frame without
+    # test / numeric-only vendors
+    total_assumed_stock = df['assumed_stock_wh'].sum()
+    st.metric(f"Total Assumed Stock WH ({selected_cycle})", f"{int(total_assumed_stock):,}")
+    total_rl = df['rl_qty_amel'].sum()
+    st.metric(f"Total RL Qty ({selected_cycle})", f"{int(total_rl):,}")
 
-    inbound_shift['week'] = pd.to_numeric(inbound_shift['week'], errors='coerce').fillna(0).astype(int)
-    
-    # Choose how many cycles to run based on Streamlit dropdown
-    selected_cycle2 = int(cycle.split()[-1]) if cycle.startswith('Cycle') else 0
-    start2 = 1
-    end2 = selected_cycle2 + 1
-
-    # Loop from Cycle 1 up to selected cycle
-    for i in range(start2, end2):
-        temp = df[['primary_vendor_name']].copy()
-        temp['week'] = i
-    
-        merged = temp.merge(inbound_shift, on=['primary_vendor_name', 'week'], how='left')
-
-    
-        # Overwrite only where forecast is available
-        df.loc[merged['inbound_shift_week'].notna(), f'future_inbound_date_{i}'] = merged['inbound_shift_week']
-        
-    col_name2 = f'future_inbound_date_{selected_cycle1}'
-
-    if col_name2 in df.columns:
-        col_data2 = pd.to_datetime(df[col_name2], errors='coerce')
-        st.write("Sample values in future_inbound_date column:")
-        st.write(col_data2.head())
-        st.write("Column dtype:", col_data2.dtype)
-    
-        df['cycle_inbound_date'] = pd.to_datetime(df['cycle_inbound_date'], errors='coerce')
-        df['future_inbound_date'] = col_data2.combine_first(df['cycle_inbound_date']).dt.strftime('%d-%b-%Y')
-    else:
-        df['future_inbound_date'] = pd.to_datetime(df['cycle_inbound_date'], errors='coerce').dt.strftime('%d-%b-%Y')
-        
-    df['future_inbound_date'] = pd.to_datetime(df['future_inbound_date'], errors='coerce').dt.strftime('%d-%b-%Y')
-
-    #holiday
-    # Ensure datetime formats
-
-    #order_holidays_df['cycle_order_date'] = pd.to_datetime(order_holidays_df['cycle_order_date'], errors='coerce').dt.normalize()
-    #inbound_holidays_df['cycle_inbound_date'] = pd.to_datetime(inbound_holidays_df['cycle_inbound_date'], errors='coerce').dt.normalize()
-        
-    #df['primary_vendor_name'] = df['primary_vendor_name'].astype(str).str.strip().str.upper()
-    #order_holidays_df['primary_vendor_name'] = order_holidays_df['primary_vendor_name'].astype(str).str.strip().str.upper()
-    #inbound_holidays_df['primary_vendor_name'] = inbound_holidays_df['primary_vendor_name'].astype(str).str.strip().str.upper()
-        
-    # Merge adjusted order dates
-    #df = df.merge(
-        #order_holidays_df[['primary_vendor_name','cycle_order_date', 'future_order_date_new']],
-        #on=['primary_vendor_name','cycle_order_date'],
-        #how='left'
-    #)
-    #st.write("Debug: Any new dates matched?", df[['primary_vendor_name', 'cycle_order_date', 'future_order_date_new']].dropna().head())
-    # Merge adjusted inbound dates
-    #df = df.merge(
-        #inbound_holidays_df[['primary_vendor_name','cycle_inbound_date', 'future_inbound_date_new']],
-        #on=['primary_vendor_name','cycle_inbound_date'],
-        #how='left'
-    #)
-    #df['is_replaced'] = df['future_order_date_new'].notna() & (df['future_order_date_new'] != df['cycle_order_date'])
-    #st.write("Sample of replaced rows:", df[df['is_replaced']][['primary_vendor_name', 'cycle_order_date', 'future_order_date_new']].head())
-    # Replace if new values are present
-    #df['cycle_order_date'] = pd.to_datetime(df['future_order_date_new'].combine_first(df['cycle_order_date']), errors='coerce')
-    #df['cycle_inbound_date'] = pd.to_datetime(df['future_inbound_date_new'].combine_first(df['cycle_inbound_date']), errors='coerce')
-
-    # Drop helper columns
-    #df.drop(columns=['future_order_date_new', 'future_inbound_date_new'], inplace=True, errors='ignore')
-    
-    # Set base values for Cycle 0 (Current)
-    df['assumed_stock_wh_0'] = df['stock_wh'].fillna(0)
-    df['assumed_ospo_qty_0'] = df['ospo_qty'].fillna(0)
-    df['rl_qty_amel_0'] = (
-        df['max_stock_wh']
-        - df['assumed_stock_wh_0']
-        - df['assumed_ospo_qty_0']
-    ).fillna(0).clip(lower=0).round()
-    df[f'avg_sales_future_cycle_0'] = df['avg_sales_final'].fillna(0)
-
-    #test
-    df['rl_qty_amel_0'] = df['original rl_qty'].fillna(0)
-    forecast_long = forecast_df.melt(
-    id_vars=['product_id', 'location_id'],
-    var_name='week',
-    value_name='forecast_value'
-    )
+    # Convert to numeric and fill NaNs
+    df['rl_qty_amel'] = pd.to_numeric(df['rl_qty_amel'], errors='coerce').fillna(0)
+    df['rl_qty_amel_cogs'] = df['rl_qty_amel'] * df['cogs']
 
-    forecast_long['week'] = forecast_long['week'].astype(int)
-
-    # Choose how many cycles to run based on Streamlit dropdown
-    selected_cycle = int(cycle.split()[-1]) if cycle.startswith('Cycle') else 0
-    start = 1
-    end = selected_cycle + 1
-
-    # Loop from Cycle 1 up to selected cycle
-    for i in range(start, end):
-        temp = df[['product_id', 'location_id']].copy()
-        temp['week'] = i
-    
-        merged = temp.merge(forecast_long, on=['product_id', 'location_id', 'week'], how='left')
-
-        # Use forecast value where available, otherwise fallback to avg_sales_final
-        df[f'avg_sales_future_cycle_{i}'] = df['avg_sales_final']  # default
-    
-        # Overwrite only where forecast is available
-        df.loc[merged['forecast_value'].notna(), f'avg_sales_future_cycle_{i}'] = merged['forecast_value']
-        
-        # Simulate future sales (can be replaced with actual forecast)
-        #df[f'avg_sales_future_cycle_{i}'] = df['avg_sales_final_{i}'] #* (1 + np.random.uniform(-0.2, 0.1, len(df)))
-
-        df[f'cycle_number_{i}'] = i
-
-        # Assumed stock WH: from previous stock + previous RL Qty - estimated sales
-        df[f'assumed_stock_wh_{i}'] = (df[f'assumed_stock_wh_{i-1}'] + df[f'assumed_ospo_qty_{i-1}'] - (df[f'avg_sales_future_cycle_{i}'] * df['period_days'])).fillna(0).clip(lower=0).round()
-
-        # Assumed OSPO: previous cycle's RL Qty
-        df[f'assumed_ospo_qty_{i}'] = df[f'rl_qty_amel_{i-1}'].fillna(0)
-
-        # RL Qty for this cycle
-        df[f'rl_qty_amel_{i}'] = (
-            df['max_stock_wh']
-            - df[f'assumed_stock_wh_{i}']
-            - df[f'assumed_ospo_qty_{i}']
-        ).fillna(0).clip(lower=0).round()
-
-        # Landed DOI for this cycle
-        df[f'landed_doi_{i}'] = (
-            (df[f'assumed_stock_wh_{i}'] + df[f'assumed_ospo_qty_{i}'] - (df[f'avg_sales_future_cycle_{i}'] * df['period_days'])) / df[f'avg_sales_future_cycle_{i}'].replace(0, np.nan)
-        ).fillna(0).clip(lower=0).round()
-
-        # Calculate the minimum JI required to ensure Landed DOI >= 1
-        df[f'min_JI_{i}'] = pd.to_numeric(
-            df[f'min_JI_{i}'] if f'min_JI_{i}' in df.columns else pd.Series(0, index=df.index),
-            errors='coerce'
-        ).fillna(0).clip(lower=0, upper=1000)
-
-        # Calculate the coverage date when Landed DOI is at least 1 (using min_JI)
-        df[f'bisa_cover_sampai_{i}'] = ((df['next_coverage_date'] + pd.to_timedelta(cycle_num * df['JI'], unit='D')) + pd.to_timedelta(df[f'min_JI_{i}'], unit='D')).dt.strftime('%d-%b-%Y')
-
-    # After loop: Output selected cycle's columns
-    df['assumed_stock_wh'] = df[f'assumed_stock_wh_{selected_cycle}']
-    df['assumed_ospo_qty'] = df[f'assumed_ospo_qty_{selected_cycle}']
-    df['rl_qty_amel'] = df[f'rl_qty_amel_{selected_cycle}']
-    df[f'avg_sales_future_cycle'] = df[f'avg_sales_future_cycle_{selected_cycle}']
-
-    # Calculate Landed DOI and Coverage date for the selected cycle
-    if str(selected_cycle).lower() == 'current':
-        df['landed_doi'] = (df['stock_wh'] + df['ospo_qty'] - (df['avg_sales_final'] * df['period_days'])) / df['avg_sales_final']
-        df['bisa_cover_sampai'] = ((df['next_order_date'] + pd.to_timedelta(2 * df['JI'], unit='D')).dt.strftime('%d-%b-%Y'))
-     
+    # Safely create 'mov' column if missing
+    if 'mov' in df.columns:
+        df['mov'] = pd.to_numeric(df['mov'], errors='coerce').fillna(1)
     else:
-        df['landed_doi'] = df.get(f'landed_doi_{selected_cycle}', ((df['stock_wh'] + df['ospo_qty'] - (df['avg_sales_final'] * df['period_days'])) / df['avg_sales_final']).round().fillna(0).clip(lower=0))
-        df['bisa_cover_sampai'] = df.get(f'bisa_cover_sampai_{selected_cycle}', ((df['next_order_date'] + pd.to_timedelta(2 * df['JI'], unit='D')).dt.strftime('%d-%b-%Y')))  # Adding the coverage date column
-
-    # Add a helper column for the cycle group
-    #df['cycle_number'] = df['future_order_date'].str.extract(r'(\d+)').astype(float)
-    
-    # Backup original value for landed_doi for logic comparison
-    df['landed_doi_original'] = df['landed_doi']
-    
-    # Set "currently oos wh" where both assumed_stock_wh and landed_doi are 0
-    df.loc[(df['assumed_stock_wh'] == 0) & (df['landed_doi_original'] == 0), 'bisa_cover_sampai'] = 'currently oos wh'
-    
-    # For rows where only landed_doi is 0, fill with the last non-zero cycle
-    # First, replace 0s with NaN in 'landed_doi' temporarily
-    
-    # Overwrite only those that are NaN landed_doi but non-zero assumed_stock_wh
-    df.loc[(df['assumed_stock_wh'] != 0) & (df['landed_doi_original'] == 0), 'bisa_cover_sampai'] = 'tambah coverage/qty'
-    df['landed_doi'] = df['landed_doi'].replace(np.nan,0)
-    # Optional: clean up helper columns
-    
-    # Optional: Output total assumptions for the selected cycle
-    assumed_stock_tot = f'assumed_stock_wh_{selected_cycle}'
-    assumed_rl = f'rl_qty_amel_{selected_cycle}'
-    if assumed_stock_tot in df.columns:
-        total_assumed_stock = df[assumed_stock_tot].sum()
-        st.metric(f"Total Assumed Stock WH ({selected_cycle})", f"{int(total_assumed_stock):,}")
-        total_rl = df[assumed_rl].sum()
-        st.metric(f"Total RL Qty ({selected_cycle})", f"{int(total_rl):,}")
-
-        rl_qty_col = 'rl_qty_amel' if selected_cycle == 'Current' else f'rl_qty_amel_{selected_cycle}'
-        
-        if rl_qty_col in df.columns:
-            # Convert to numeric and fill NaNs
-            df[rl_qty_col] = pd.to_numeric(df[rl_qty_col], errors='coerce').fillna(0)
-            # Optionally create a multiplied value column
-            df[f'{rl_qty_col}_cogs'] = df[rl_qty_col] * df['cogs']
-        else:
-            df[rl_qty_col] = 0
-            df[f'{rl_qty_col}_cogs'] = 0
-    
-        # Safely create 'mov' column if missing
-        if 'mov' in df.columns:
-            df['mov'] = pd.to_numeric(df['mov'], errors='coerce').fillna(1)
-        else:
-            df['mov'] = 1  # Default to 1 if MOV not available
-    
-        # Calculate summary by vendor
-        df = df[~df['primary_vendor_name'].astype(str).str.upper().isin(['0', 'TESTING'])]
-        df = df[~df['primary_vendor_name'].astype(str).str.match(r'^\d+$')]
-        summary_df = (
-            df.groupby(['primary_vendor_name', 'location_id'])
-            .agg(
-                total_rl_value=(f'{rl_qty_col}_cogs', 'sum'),
-                total_rl_qty=(rl_qty_col, 'sum'),
-                total_assumed_stock=(assumed_stock_tot, 'sum'),
-                total_cogs=('cogs', 'sum'),
-                avg_mov=('mov', 'mean')
-            )
-            .reset_index()
-        )
-        summary_df['avg_mov'] = summary_df['avg_mov'].replace(0, 1).fillna(1)  # Avoid division by 0
-        summary_df['location_id'] = summary_df['location_id']
-        summary_df['rl_to_mov_ratio'] = summary_df['total_rl_value'] / summary_df['avg_mov']
-        summary_df['avg_mov'] = summary_df['avg_mov'].replace(1, 0)
-        summary_df['rl_to_mov_ratio'] = summary_df.apply(
-            lambda row: 1 if row['avg_mov'] == 0 else min(row['total_rl_value'] / row['avg_mov'], 1),
-            axis=1
+        df['mov'] = 1  # Default to 1 if MOV not available
+
+    # Calculate summary by vendor
+    df = df[~df['primary_vendor_name'].astype(str).str.upper().isin(['0', 'TESTING'])]
+    df = df[~df['primary_vendor_name'].astype(str).str.match(r'^\d+$')]
+    summary_df = (
+        df.groupby(['primary_vendor_name', 'location_id'])
+        .agg(
+            total_rl_value=('rl_qty_amel_cogs', 'sum'),
+            total_rl_qty=('rl_qty_amel', 'sum'),
+            total_assumed_stock=('assumed_stock_wh', 'sum'),
+            total_cogs=('cogs', 'sum'),
+            avg_mov=('mov', 'mean')
         )
-        summary_df['rl_to_mov_ratio'] = summary_df['rl_to_mov_ratio'].clip(upper=1)  # Cap at 1 (100%)
-        summary_df['rl_to_mov_ratio'] = (summary_df['rl_to_mov_ratio'] * 100).round(2).astype(str) + '%'  # Convert to % string
-        st.dataframe(summary_df)
+        .reset_index()
+    )
+    summary_df['avg_mov'] = summary_df['avg_mov'].replace(0, 1).fillna(1)  # Avoid division by 0
+    summary_df['rl_to_mov_ratio'] = summary_df['total_rl_value'] / summary_df['avg_mov']
+    summary_df['avg_mov'] = summary_df['avg_mov'].replace(1, 0)
+    summary_df['rl_to_mov_ratio'] = summary_df.apply(
+        lambda row: 1 if row['avg_mov'] == 0 else min(row['total_rl_value'] / row['avg_mov'], 1),
+        axis=1
+    )
+    summary_df['rl_to_mov_ratio'] = summary_df['rl_to_mov_ratio'].clip(upper=1)  # Cap at 1 (100%)
+    summary_df['rl_to_mov_ratio'] = (summary_df['rl_to_mov_ratio'] * 100).round(2).astype(str) + '%'  # Convert to % string
+    st.dataframe(summary_df)
+
+    summary_distribution = (
+                df.groupby(['primary_vendor_name','vendor_frequency'])
+                .agg(total_rl_qty_per_cycle=('rl_qty_amel', 'sum'))
+                .reset_index()
+            )
 
-        summary_distribution = (
-                    df.groupby(['primary_vendor_name','vendor_frequency'])
-                    .agg(total_rl_qty_per_cycle=('rl_qty_amel', 'sum'))
-                    .reset_index()
-                )
-        
-        # Show result
-        summary_distribution = summary_distribution[summary_distribution['vendor_frequency'] >= 2]
+    # Show result
+    summary_distribution = summary_distribution[summary_distribution['vendor_frequency'] >= 2]
 
-        st.dataframe(summary_distribution)
+    st.dataframe(summary_distribution)
 
+    if frequency_df is not None:
         frequency_df_clean = frequency_df.drop_duplicates(subset=['vendor_id', 'primary_vendor_name', 'vendor_frequency'])
 
         # Step 2: Merge frequency into the main df
         merged = df.merge(frequency_df_clean, on=['vendor_id', 'primary_vendor_name', 'vendor_frequency'], how='left')
-        
+
         # Step 3: Clean and prep columns
         merged['vendor_frequency'] = pd.to_numeric(merged['vendor_frequency'], errors='coerce').fillna(1)
         merged['selisih_hari'] = merged['selisih_hari'].fillna('0').astype(str)
         merged['selisih_hari_int'] = pd.to_numeric(merged['selisih_hari'], errors='coerce').fillna(0).astype(int)
-        merged['base_date'] = pd.to_datetime(merged['future_inbound_date'], format='%d-%b-%Y', errors='coerce')
-        
+        merged['base_date'] = merged['future_inbound_date']
+
         # Step 4: Get the first base_date per vendor
         first_base_date = (
             merged.groupby(['vendor_id', 'primary_vendor_name', 'vendor_frequency'])['base_date']
@@ -348,116 +191,47 @@ def calculate_columns(df, cycle, frequency_df, forecast_df, order_holidays_df, i
             .reset_index()
             .rename(columns={'base_date': 'first_base_date'})
         )
-        
+
         # Step 5: Merge back to assign the correct base_date per vendor
         merged = merged.merge(first_base_date, on=['vendor_id', 'primary_vendor_name', 'vendor_frequency'], how='left')
-        
+
         # Step 6: Calculate future date freq using vectorized operations
-        merged['future_date_freq'] = (merged['first_base_date'] + pd.to_timedelta(merged['selisih_hari_int'], unit='D')).dt.strftime('%d-%b-%Y')
-        
+        merged['future_date_freq'] = merged['first_base_date'] + pd.to_timedelta(merged['selisih_hari_int'], unit='D')
+
         # Step 7: Calculate qty per day based on frequency
         merged['qty_per_day_freq'] = merged['rl_qty_amel'] / merged['vendor_frequency']
-        
+
         # Step 8: Final grouping - one row per vendor per future frequency date
         summary_distribution2 = (
             merged.groupby(['primary_vendor_name', 'vendor_frequency', 'first_base_date', 'future_date_freq'])
             .agg(total_rl_qty_per_cycle2=('qty_per_day_freq', 'sum'))
             .reset_index()
         )
-        
-        # Step 9: Optional filtering and formatting
+
+        # Step 9: Optional filtering
         summary_distribution2 = summary_distribution2[summary_distribution2['vendor_frequency'] >= 2]
-        summary_distribution2['first_base_date'] = summary_distribution2['first_base_date'].dt.strftime('%d-%b-%Y')
-        
+
         # Step 10: Display result
-        st.dataframe(summary_distribution2)
-
-        #detailed_rl_distribution = None
-        #if frequency_df is not None:
-            #merge_columns = ['vendor_id', 'primary_vendor_name', 'vendor_frequency']
-            #merged = df.merge(frequency_df, on=merge_columns, how='left')
-            
-            #merged['vendor_frequency'] = merged['vendor_frequency'].fillna(1)
-            #merged['selisih_hari'] = merged['selisih_hari'].fillna('0')
-    
-            #expanded_rows = []
-
-            #for _, row in merged.iterrows():
-                #selisih_days = str(row['selisih_hari']).split(',')
-        
-                # Handle case where selisih_hari is '0' or missing
-                #if selisih_days == ['0']:
-                    #qty_per_day = row['rl_qty_amel']  # full amount to the base date
-                    #future_date = pd.to_datetime(row['future_inbound_date'], format='%d-%b-%Y', errors='coerce')#pd.to_datetime(row['future_inbound_date']).strftime('%d-%b-%Y')
-                    #expanded_rows.append({
-                        #'primary_vendor_name': row['primary_vendor_name'],
-                        #'location_id': row['location_id'],
-                        #'future_inbound_date': future_date,
-                        #'rl_qty_per_cycle': qty_per_day
-                    #})
-                #else:
-                    #try:
-                        #vendor_freq = float(row['vendor_frequency']) if row['vendor_frequency'] else 1
-                        #qty_per_day = row['rl_qty_amel'] / vendor_freq #gblh per row
-                    #except ZeroDivisionError:
-                        #qty_per_day = row['rl_qty_amel']
-                
-                    #try:
-                        #base_date = pd.to_datetime(row['future_inbound_date'], format='%d-%b-%Y', errors='coerce')
-                        #if pd.isna(base_date):
-                            #continue
-                
-                        #for day_offset in selisih_days:
-                            #try:
-                                #offset = int(day_offset.strip())
-                                #delivery_date = (base_date + pd.Timedelta(days=offset)).strftime('%d-%b-%Y')
-                
-                                #expanded_rows.append({
-                                  #  'primary_vendor_name': row['primary_vendor_name'],
-                                  #  'location_id': row['location_id'],
-                                  #  'future_inbound_date': delivery_date,  # This is the actual delivery date
-                                  #  'rl_qty_per_cycle': qty_per_day #* vendor_freq
-                                #})
-                            #except Exception:
-                                #continue
-                    #except Exception:
-                        #continue
-        
-            #detailed_rl_distribution = pd.DataFrame(expanded_rows)
-        
-            # Ensure all rows are included in summary, even if selisih_hari = 0
-            #if not detailed_rl_distribution.empty:
-
-    # Then build the pivot
-    #rl_columns = [col for col in df.columns if col.startswith('rl_qty_amel_')]
-    #future_dates = [col for col in df.columns if col.startswith('future_inbound_date_')]
-
-    #rl_col = f'rl_qty_amel_{selected_cycle}'
-    #date_col = f'future_inbound_date_{selected_cycle}'
-    
+        st.dataframe(format_dates(summary_distribution2))
+
+    # RL qty of cycles 5 .. selected by each cycle's future inbound date
     summary_rows = []
-    
     for i in range(5, selected_cycle+1):
-        rl_col = f'rl_qty_amel_{i}'
-        date_col = f'future_inbound_date_{i}'
-    
-        if rl_col in df.columns and date_col in df.columns:
-            temp = df[['product_id', 'product_name', 'location_id', 'primary_vendor_name', rl_col, date_col]].copy()
-            temp = temp.rename(columns={
-                    rl_col: 'rl_qty_amel',
-                    date_col: 'future_inbound_date'
-            })
-            temp['cycle'] = i
-            summary_rows.append(temp)
-        
+        columns = cycle_columns(store, i, df.index.to_numpy())
+        temp = df[['product_id', 'product_name', 'location_id', 'primary_vendor_name']].copy()
+        temp['rl_qty_amel'] = columns['rl_qty_amel'].astype(float)
+        temp['future_inbound_date'] = columns['future_inbound_date']
+        temp['cycle'] = i
+        summary_rows.append(temp)
+
+    if summary_rows:
         # Combine all cycles
         rl_long = pd.concat(summary_rows, ignore_index=True)
-            
+
         # Clean up
-        rl_long['future_inbound_date'] = pd.to_datetime(rl_long['future_inbound_date'], errors='coerce').dt.strftime('%d-%b-%Y')
         rl_long['rl_qty_amel'] = pd.to_numeric(rl_long['rl_qty_amel'], errors='coerce').fillna(0)
         rl_long = rl_long.drop_duplicates()
-            
+
         # Pivot: Dates as columns, no summing
         pivot_df = rl_long.pivot_table(
                 index=['product_id', 'product_name', 'location_id', 'primary_vendor_name'],
@@ -465,15 +239,44 @@ def calculate_columns(df, cycle, frequency_df, forecast_df, order_holidays_df, i
                 values='rl_qty_amel',
                 aggfunc='first'  # 👈 no summing
         ).fillna(0).reset_index()
-            
+
         pivot_df.columns.name = None  # Clean column names
-            
+        pivot_df.columns = [col.strftime(DATE_FORMAT) if isinstance(col, pd.Timestamp) else col for col in pivot_df.columns]
+
         # Show it
         #st.subheader("RL Qty by Future Inbound Date (No Aggregation)")
         st.dataframe(pivot_df)
-    
+
     return df
-    
+
+
+def cycle_result(store, cycle, frequency_df):
+    # Selected cycle ('Current' or 'Cycle N') of the simulated cycles, with its summaries shown
+    match = re.search(r'Cycle\s*(\d+)', cycle)
+    selected_cycle = int(match.group(1)) if match else 0
+    return show_cycle_summaries(cycle_frame(store, selected_cycle), store, selected_cycle, frequency_df)
+
+
+def upload_key(*files):
+    # Content hash per upload (None when missing), so re-uploading the same files hits the cache
+    return tuple(hashlib.md5(file.getvalue()).hexdigest() if file else None for file in files)
+
+
+# (vendor, week) holiday shift lookup, built once per holiday upload
+@st.cache_data
+def load_holiday_shift(file_key, _holiday_file):
+    return holiday_shift_table(read_upload(_holiday_file, ['primary_vendor_name']), NUM_CYCLES)
+
+
+# All cycles simulated once per set of uploaded files; switching cycle only slices the result.
+# The store is read-only, so every rerun and session shares the cached object instead of a copy.
+# Only the latest few upload sets are kept, and none for longer than a working day.
+@st.cache_resource(max_entries=CYCLE_CACHE_ENTRIES, ttl=CYCLE_CACHE_TTL)
+def load_cycles(files_key, _uploaded_file, _forecast_file, _order_shift, _inbound_shift):
+    df = pd.read_excel(_uploaded_file)
+    forecast_df = read_upload(_forecast_file, ['product_id', 'location_id'])
+    return simulate_all_cycles(df, forecast_df, _order_shift, _inbound_shift)
+
 
 # Streamlit Interface
 def main():
@@ -486,19 +289,17 @@ def main():
     inbound_holiday_file = st.file_uploader("Upload Inbound Holiday File", type=["csv", "xlsx"])
 
     if uploaded_file is not None:
-        df = load_data(uploaded_file)
-        frequency_df = pd.read_csv(freq_file) if freq_file and freq_file.name.endswith('.csv') else pd.read_excel(freq_file) if freq_file else None
-        forecast_df = pd.read_csv(forecast_file)
-        order_holidays_df = pd.read_csv(order_holiday_file) if order_holiday_file else pd.DataFrame(columns=['vendor_id', 'holiday_date'])
-        inbound_holidays_df = pd.read_csv(inbound_holiday_file) if inbound_holiday_file else pd.DataFrame(columns=['vendor_id', 'holiday_date'])
+        frequency_df = read_upload(freq_file)
+        order_shift = load_holiday_shift(upload_key(order_holiday_file), order_holiday_file)
+        inbound_shift = load_holiday_shift(upload_key(inbound_holiday_file), inbound_holiday_file)
+        files_key = upload_key(uploaded_file, forecast_file, order_holiday_file, inbound_holiday_file)
+        store = load_cycles(files_key, uploaded_file, forecast_file, order_shift, inbound_shift)
 
-        
         # Cycle selector
-        num_cycles = 14
-        cycle_options = ['Current'] + [f'Cycle {i}' for i in range(1, num_cycles + 1)]
+        cycle_options = ['Current'] + [f'Cycle {i}' for i in range(1, NUM_CYCLES + 1)]
         selected_cycle = st.selectbox("Select Cycle", cycle_options)
 
-        result_df = calculate_columns(df.copy(), selected_cycle, frequency_df, forecast_df, order_holidays_df, inbound_holidays_df)
+        result_df = cycle_result(store, selected_cycle, frequency_df)
 
         # Show only selected columns
         cols_to_show = [
@@ -508,7 +309,7 @@ def main():
         existing_cols = [col for col in cols_to_show if col in result_df.columns]
 
         st.success("Calculation complete.")
-        st.dataframe(result_df[existing_cols])
+        st.dataframe(format_dates(result_df[existing_cols + ['cover_status']]))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Dry WH stock extracts carry no wh_id, the WH is implied by the file
+DRY_STOCK_FILES = {40: "kos.xlsx", 772: "stl.xlsx"}
+SIT_FILE = "sit.xlsx"
+OSPO_FILE = "ospo.xlsx"
+
+STOCK_KEYS = ["wh_id", "product_id"]
+SIT_KEYS = ["wh_id", "hub_id", "product_id"]
+
+# WH-level quantities (on hand, open PO) sit on hub_id 0 rows of the inventory position
+WH_LEVEL_HUB = 0
+POSITION_COLUMNS = ["on_hand", "in_transit", "open_po"]
+
+# attrs entry of the inventory position (and views of it): {source name: rows sharing a key}
+DUPLICATES_ATTR = "duplicate source rows"
+
+
+def snapshot_index(df, keys, values, name, aggregate=False, duplicates=None):
+    # Inventory snapshot indexed by unique keys. Duplicate keys fail fast unless the source
+    # legitimately has several lines per key (e.g. open POs), then they are summed. How many
+    # rows shared a key goes to duplicates[name] when given, before anything is collapsed.
+    df = df[list(keys) + list(values)].copy()
+    df[keys] = df[keys].apply(pd.to_numeric).astype("int64")
+
+    duplicated = df.duplicated(keys, keep=False)
+    if duplicates is not None:
+        duplicates[name] = int(duplicated.sum())
+    if duplicated.any() and not aggregate:
+        sample = df.loc[duplicated, keys].drop_duplicates().head(5).to_dict("records")
+        raise ValueError(f"{name}: {duplicated.sum()} rows share a ({', '.join(keys)}) key, e.g. {sample}")
+
+    return df.groupby(keys, sort=True)[list(values)].sum()
+
+
+def load_stock_snapshot(files=DRY_STOCK_FILES, duplicates=None):
+    # One (wh_id, product_id) stock snapshot from per-WH extracts, tagged with their WH
+    stock_df = pd.concat([pd.read_excel(path).assign(wh_id=wh_id) for wh_id, path in files.items()], ignore_index=True)
+    return snapshot_index(stock_df, STOCK_KEYS, ["stock"], "stock", duplicates=duplicates)
+
+
+def guarded_merge(left, snapshot, name, fill_value=0, report=None):
+    # Left join of a snapshot onto left on the snapshot's index keys. The snapshot side must
+    # be unique, so the row count cannot change; a bad extract raises instead of fanning out.
+    # Unmatched rows get fill_value (None keeps them NaN). Row counts before / after, how many
+    # rows found a match and how many source rows shared a snapshot key (summed when the
+    # snapshot was built, see snapshot_index) go to report when given.
+    keys = list(snapshot.index.names)
+    missing = [key for key in keys if key not in left.columns]
+    if missing:
+        raise KeyError(f"{name}: join keys {missing} not in the left frame")
+
+    rows_before = len(left)
+    try:
+        merged = left.merge(snapshot.reset_index(), on=keys, how="left", validate="many_to_one", indicator=True)
+    except pd.errors.MergeError as err:
+        raise pd.errors.MergeError(f"{name}: {err}") from err
+    if len(merged) != rows_before:
+        raise ValueError(f"{name}: join changed the row count from {rows_before:,} to {len(merged):,}")
+
+    matched = int((merged.pop("_merge") == "both").sum())
+    if fill_value is not None:
+        merged[list(snapshot.columns)] = merged[list(snapshot.columns)].fillna(fill_value)
+
+    if report is not None:
+        report.append({"join": name, "rows before": rows_before, "rows after": len(merged), "matched": matched,
+                       "duplicate source rows": sum(snapshot.attrs.get(DUPLICATES_ATTR, {}).values())})
+    return merged
+
+
+def inventory_source_files(stock_files=DRY_STOCK_FILES, sit_file=SIT_FILE, ospo_file=OSPO_FILE):
+    return list(stock_files.values()) + [sit_file, ospo_file]
+
+
+def inventory_source_mtimes(stock_files=DRY_STOCK_FILES, sit_file=SIT_FILE, ospo_file=OSPO_FILE):
+    # Cache key for the inventory position: every source file with its modification time
+    return tuple((path, os.path.getmtime(path)) for path in inventory_source_files(stock_files, sit_file, ospo_file))
+
+
+def build_inventory_position(stock_files=DRY_STOCK_FILES, sit_file=SIT_FILE, ospo_file=OSPO_FILE):
+    # One (wh_id, hub_id, product_id) table with on_hand, in_transit and open_po.
+    # On hand and open PO are WH-level and sit on hub_id WH_LEVEL_HUB; stock in transit is
+    # per hub. Keys and whole-unit quantities are int32 (int64 when a quantity needs it);
+    # quantities are not downcast further, so on_hand + open_po cannot wrap around.
+    # WH products with an open PO but no stock extract row keep on_hand NaN (float64), so
+    # they can be told apart from products the extract lists with 0 stock.
+    # Rows sharing a key in each source are counted in attrs[DUPLICATES_ATTR].
+    duplicates = {}
+    on_hand = load_stock_snapshot(stock_files, duplicates).rename(columns={"stock": "on_hand"})
+    open_po = snapshot_index(pd.read_excel(ospo_file), STOCK_KEYS, ["quantity_po"], "incoming PO", aggregate=True,
+                             duplicates=duplicates)
+    in_transit = snapshot_index(pd.read_excel(sit_file), SIT_KEYS, ["quantity"], "stock in transit", duplicates=duplicates)
+
+    wh_level = on_hand.join(open_po.rename(columns={"quantity_po": "open_po"}), how="outer")
+    wh_level = wh_level.assign(hub_id=WH_LEVEL_HUB).set_index("hub_id", append=True).reorder_levels(SIT_KEYS)
+
+    position = pd.concat([wh_level, in_transit.rename(columns={"quantity": "in_transit"}).assign(on_hand=0)])
+    position = position.reindex(columns=POSITION_COLUMNS).fillna({"in_transit": 0, "open_po": 0}).reset_index()
+    position[SIT_KEYS] = position[SIT_KEYS].astype("int32")
+    quantities = position[POSITION_COLUMNS].apply(pd.to_numeric, downcast="integer")
+    position[POSITION_COLUMNS] = quantities.astype({col: np.promote_types(dtype, np.int32)
+                                                    for col, dtype in quantities.dtypes.items() if dtype.kind == "i"})
+    position = position.sort_values(SIT_KEYS).set_index(SIT_KEYS)
+    position.attrs[DUPLICATES_ATTR] = duplicates
+    return position
+
+
+def wh_stock(position, include_po=True):
+    # (wh_id, product_id) WH stock from the inventory position, incoming PO included by default.
+    # On hand only covers the products of the stock extracts; PO-only products are left out.
+    wh_level = position.xs(WH_LEVEL_HUB, level="hub_id")
+    on_hand = wh_level["on_hand"]
+    stock = (on_hand.fillna(0) + wh_level["open_po"] if include_po else on_hand.dropna()).to_frame("stock")
+    stock.attrs[DUPLICATES_ATTR] = source_duplicates(position, ["stock", "incoming PO"] if include_po else ["stock"])
+    return stock
+
+
+def source_duplicates(position, names):
+    counts = position.attrs.get(DUPLICATES_ATTR, {})
+    return {name: counts[name] for name in names if name in counts}
+
+
+def hub_in_transit(position):
+    # (wh_id, hub_id, product_id) stock in transit to hubs
+    hub_level = position[position.index.get_level_values("hub_id") != WH_LEVEL_HUB][["in_transit"]]
+    hub_level.attrs[DUPLICATES_ATTR] = source_duplicates(position, ["stock in transit"])
+    return hub_level
@@ -0,0 +1,84 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from product_projection import product_projection, product_row_inputs, project_product_rows
+
+# Per-row inputs that are not part of the fingerprint as-is (stock and priority are hashed
+# per row as the row's group stock and its rank inside the group)
+GROUP_INPUTS = ("group", "stock", "priority")
+
+
+class ProjectionState(NamedTuple):
+    # What a run leaves behind for the next one: per-row (WH, hub, product) key hashes, the
+    # (WH, product) group hash and hub of each row, input fingerprints and the float32 metrics
+    row_keys: np.ndarray
+    group_keys: np.ndarray
+    hub_ids: np.ndarray
+    fingerprints: np.ndarray
+    metrics: dict
+
+
+def hash_columns(columns):
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+
+
+def row_fingerprints(inputs):
+    # uint64 hash of everything a row's projection depends on
+    columns = {name: values for name, values in inputs.items() if name not in GROUP_INPUTS and values.ndim == 1}
+    columns.update({f"demand {day}": inputs["hub_demand"][:, day] for day in range(inputs["hub_demand"].shape[1])})
+    if "stock" in inputs:
+        columns["stock"] = inputs["stock"][inputs["group"]]
+        columns["priority rank"] = pd.Series(inputs["priority"]).groupby(inputs["group"]).rank(method="first").to_numpy()
+    return hash_columns(columns)
+
+
+def project_product_so_incremental(so_df, product_demand, previous=None, wh_col="WH ID", hub_col="hub_id", wh_stock=None):
+    # project_product_so that reuses the previous run's results for rows whose inputs did not
+    # change. With WH stock, allocation ties the rows of a (WH, product) group together, so a
+    # group is recomputed as a whole when any of its rows changed, appeared or disappeared.
+    # Returns the projection, the state for the next run, the mask of recomputed rows and the
+    # hubs with changed, new or removed rows (all hubs when there is no usable previous run).
+    inputs = product_row_inputs(so_df, product_demand, wh_col, wh_stock)
+    n_days = inputs["hub_demand"].shape[1]
+
+    row_keys = hash_columns({"wh": so_df[wh_col].to_numpy(), "hub": so_df[hub_col].to_numpy(),
+                             "product": so_df["product_id"].to_numpy()})
+    group_keys = hash_columns({"wh": so_df[wh_col].to_numpy(), "product": so_df["product_id"].to_numpy()})
+    fingerprints = row_fingerprints(inputs)
+    hub_ids = so_df[hub_col].to_numpy()
+
+    changed = np.ones(len(so_df), dtype=bool)
+    changed_hubs = pd.unique(hub_ids)
+    previous_pos = np.full(len(so_df), -1)
+    usable = (previous is not None and pd.Index(row_keys).is_unique
+              and ("Allocated SO Qty" in previous.metrics) == ("stock" in inputs)
+              and all(values.shape[1] == n_days for values in previous.metrics.values()))
+    if usable:
+        previous_pos = pd.Index(previous.row_keys).get_indexer(row_keys)
+        found = previous_pos >= 0
+        changed = ~found | (previous.fingerprints[previous_pos] != fingerprints)
+        gone = ~np.isin(previous.row_keys, row_keys)
+        changed_hubs = np.union1d(hub_ids[changed], previous.hub_ids[gone])
+
+        if "stock" in inputs:
+            # Groups with a changed or new row, or a row that is gone since the last run
+            changed_groups = np.union1d(group_keys[changed], previous.group_keys[gone])
+            changed = np.isin(group_keys, changed_groups)
+
+    per_row = {name: values[changed] for name, values in inputs.items() if name != "stock"}
+    if "stock" in inputs:
+        per_row["stock"] = inputs["stock"]
+    computed = project_product_rows(**per_row)
+
+    metrics = {}
+    for name, values in computed.items():
+        metrics[name] = np.empty((len(so_df), n_days), dtype=np.float32)
+        metrics[name][changed] = values
+        if usable:
+            metrics[name][~changed] = previous.metrics[name][previous_pos[~changed]]
+
+    projection = product_projection(so_df, metrics, wh_col, hub_col)
+    state = ProjectionState(row_keys, group_keys, hub_ids, fingerprints, projection.metrics)
+    return projection, state, changed, changed_hubs
@@ -0,0 +1,121 @@
+import datetime
+
+import numpy as np
+
+try:
+    import polars as pl
+except ImportError:  # optional backend
+    pl = None
+
+from forecast_store import PRODUCT_FORECAST_FILE, forecast_parquet
+from inventory_position import WH_LEVEL_HUB
+from product_projection import HUB_PRIORITY_COL, SHARED_SKU_SPLIT, product_projection
+
+POLARS_AVAILABLE = pl is not None
+
+KEYS = ["wh_id", "hub_id", "product_id"]
+
+
+def truncate(expr):
+    # np.trunc: round toward zero
+    return pl.when(expr < 0).then(expr.ceil()).otherwise(expr.floor())
+
+
+def product_pipeline_plan(so_df, inventory_position, forecast_dates, forecast_path=PRODUCT_FORECAST_FILE):
+    # The product-level pipeline as one lazy query: SO rows joined with stock in transit, dry
+    # forecast scanned from its parquet copy (date filter pushed down) and allocated to WHs,
+    # spread to hubs, projected, and WH stock allocated in priority order day by day.
+    # so_df is keyed by wh_id / hub_id / product_id; one output row per SO row, in order.
+    n_days = len(forecast_dates)
+    start = datetime.date.fromisoformat(forecast_dates[0]) - datetime.timedelta(days=1)
+    dates = [datetime.date.fromisoformat(date) for date in forecast_dates]
+
+    so_cols = KEYS + ["Sum of hub_qty", "Sum of maxqty", "Sum of multiplier", "Sum of qty_so_final"]
+    if HUB_PRIORITY_COL in so_df:
+        so_cols.append(HUB_PRIORITY_COL)
+    so = (pl.from_pandas(so_df[so_cols]).lazy()
+          .with_row_index("row")
+          .with_columns(pl.col(KEYS).cast(pl.Int64)))
+    priority = pl.col(HUB_PRIORITY_COL).cast(pl.Float64) if HUB_PRIORITY_COL in so_df else pl.col("row").cast(pl.Float64)
+
+    position = pl.from_pandas(inventory_position.reset_index()).lazy().with_columns(pl.col(KEYS).cast(pl.Int64))
+    in_transit = position.filter(pl.col("hub_id") != WH_LEVEL_HUB).select(KEYS + ["in_transit"])
+    wh_stock = (position.filter(pl.col("hub_id") == WH_LEVEL_HUB)
+                .select("wh_id", "product_id",
+                        (pl.col("on_hand").cast(pl.Float64).fill_nan(0).fill_null(0) + pl.col("open_po").cast(pl.Float64))
+                        .alias("stock")))
+
+    # Stock in transit on top of the hub qty, row share of its (WH, product) qty_so_final
+    # (even split over the product's hubs when none has an SO)
+    qty_so_final = pl.col("Sum of qty_so_final").cast(pl.Float64).fill_null(0)
+    product_total = qty_so_final.sum().over("wh_id", "product_id")
+    so = (so.join(in_transit, on=KEYS, how="left", validate="m:1", maintain_order="left")
+          .with_columns(
+              (pl.col("Sum of hub_qty") + pl.col("in_transit").fill_null(0)).cast(pl.Float64).alias("hub_qty"),
+              pl.when(product_total > 0).then(qty_so_final / product_total)
+              .otherwise(1 / pl.len().over("wh_id", "product_id")).alias("share"),
+              priority.alias("priority"),
+          ))
+
+    # Dry forecast per (product, day), split over the dry WHs that carry the product
+    forecast = (pl.scan_parquet(forecast_parquet(forecast_path))
+                .filter(pl.col("date_key").dt.date().is_in(dates))
+                .select(pl.col("product_id").cast(pl.Int64),
+                        (pl.col("date_key").dt.date() - pl.lit(start)).dt.total_days().alias("day"),
+                        pl.col("Forecast Step 3"))
+                .group_by("product_id", "day").agg(pl.col("Forecast Step 3").sum()))
+    carried = (so.filter(pl.col("wh_id").is_in(list(SHARED_SKU_SPLIT)))
+               .select("product_id", "wh_id").unique()
+               .join(forecast.select("product_id").unique(), on="product_id", how="semi")
+               .with_columns(pl.len().over("product_id").alias("n_whs")))
+    split = (pl.when(pl.col("n_whs") > 1)
+             .then(pl.col("wh_id").replace_strict(SHARED_SKU_SPLIT, return_dtype=pl.Float64))
+             .otherwise(1.0))
+    wh_demand = (forecast.join(carried, on="product_id")
+                 .select("product_id", "wh_id", "day", truncate(pl.col("Forecast Step 3") * split).alias("demand")))
+
+    # One row per SO row and day: hub demand, updated hub qty and predicted SO (whole units,
+    # like the pandas backend)
+    days = pl.LazyFrame({"day": np.arange(1, n_days + 1)}).with_columns(pl.col("day").cast(pl.Int64))
+    multiplier = pl.col("Sum of multiplier").cast(pl.Float64)
+    updated = (pl.col("hub_qty") - pl.col("share") * pl.col("demand").fill_null(0)).clip(lower_bound=0)
+    daily = (so.join(days, how="cross")
+             .join(wh_demand, on=["product_id", "wh_id", "day"], how="left")
+             .with_columns(updated.alias("updated"))
+             .with_columns((((pl.col("Sum of maxqty") - pl.col("updated")) / multiplier) * multiplier).round(0).alias("predicted"))
+             .group_by("row")
+             .agg(pl.col("updated").sort_by("day"), pl.col("predicted").sort_by("day"))
+             .with_columns(
+                 *[pl.col("updated").list.get(day).alias(f"updated {day}") for day in range(n_days)],
+                 *[pl.col("predicted").list.get(day).alias(f"predicted {day}") for day in range(n_days)],
+             )
+             .drop("updated", "predicted"))
+
+    # WH stock handed out per (WH, product) in priority order, each day against the opening stock
+    plan = (so.join(daily, on="row")
+            .join(wh_stock, on=["wh_id", "product_id"], how="left")
+            .with_columns(pl.col("stock").fill_null(float("inf"))))
+    group = ["wh_id", "product_id"]
+    for day in range(n_days):
+        demand = pl.col(f"predicted {day}").fill_nan(0).fill_null(0).clip(lower_bound=0)
+        cumulative = demand.cum_sum().over(group, order_by=["priority", "row"])
+        plan = plan.with_columns(pl.when(cumulative <= pl.col("stock")).then(demand).otherwise(0.0).alias(f"allocated {day}"))
+
+    return plan.sort("row")
+
+
+def project_product_so_polars(so_df, inventory_position, forecast_dates, forecast_path=PRODUCT_FORECAST_FILE):
+    # Polars version of the pandas product pipeline (stock in transit join,
+    # allocate_product_demand, project_product_so with WH stock) for a wh_id-keyed SO frame
+    result = product_pipeline_plan(so_df, inventory_position, forecast_dates, forecast_path).collect()
+    n_days = len(forecast_dates)
+
+    def metric(prefix):
+        return result.select([f"{prefix} {day}" for day in range(n_days)]).to_numpy().astype(float).reshape(len(result), n_days)
+
+    metrics = {
+        "Updated Hub Qty": metric("updated"),
+        "Predicted SO Qty": metric("predicted"),
+        "Allocated SO Qty": metric("allocated"),
+    }
+    return product_projection(so_df, metrics, wh_col="wh_id")
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from product_projection import (HUB_PRIORITY_COL, ProductDemand, product_projection, product_row_inputs,
+                                project_product_rows)
+
+# SO columns the workers build their partition's inputs from, shared as raw arrays
+ROW_COLUMNS = ["product_id", "Sum of hub_qty", "Sum of maxqty", "Sum of multiplier", "Sum of qty_so_final"]
+# The WH column's name inside a worker
+WH_COL = "wh"
+
+
+def partition_rows(wh_id, product_id, product_chunks=1):
+    # Row order that puts every (WH, product range) partition in one contiguous run, and the
+    # [start, stop) bounds of the runs in that order. Products are never split over ranges, so
+    # a (WH, product) stock group always stays inside one partition.
+    _, wh_code = np.unique(wh_id, return_inverse=True)
+    product_ids, product_code = np.unique(product_id, return_inverse=True)
+    chunk = product_code * product_chunks // max(len(product_ids), 1)
+
+    order = np.lexsort((np.arange(len(wh_code)), chunk, wh_code))
+    key = wh_code[order] * product_chunks + chunk[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(order) else np.array([], dtype=int)
+    bounds = list(zip(starts, np.r_[starts[1:], len(order)]))
+    return order, bounds
+
+
+def to_shared(arrays):
+    # Copy arrays into new shared memory blocks; returns the blocks and the specs to attach them
+    blocks, specs = {}, {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks[name] = block
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_shared(specs):
+    blocks = {name: shared_memory.SharedMemory(name=spec[0]) for name, spec in specs.items()}
+    arrays = {name: np.ndarray(shape, dtype, buffer=blocks[name].buf) for name, (_, shape, dtype) in specs.items()}
+    return blocks, arrays
+
+
+def partition_inputs(inputs, rows):
+    # product_row_inputs for one partition, built from the shared raw columns. Share matrix
+    # and stock groups are per (WH, product), which never spans partitions, so they come
+    # out the same as for the whole table. Small arrays are copied so no view outlives the block.
+    part_df = pd.DataFrame({name: inputs[name][rows] for name in ROW_COLUMNS + [WH_COL, HUB_PRIORITY_COL]})
+    product_demand = ProductDemand(inputs["product_ids"].copy(), inputs["wh_ids"].copy(), inputs["demand"])
+    wh_stock = None
+    if "stock" in inputs:
+        wh_stock = pd.Series(inputs["stock"].copy(),
+                             index=pd.MultiIndex.from_arrays([inputs["stock_wh"].copy(), inputs["stock_product"].copy()]))
+    return product_row_inputs(part_df, product_demand, WH_COL, wh_stock)
+
+
+def project_partition(input_specs, output_specs, start, stop):
+    # Pool worker: build the inputs of rows order[start:stop], run the projection and write
+    # them into the shared outputs. Partitions cover disjoint rows, so workers never write
+    # to the same cells.
+    input_blocks, inputs = attach_shared(input_specs)
+    output_blocks, outputs = attach_shared(output_specs)
+    try:
+        rows = inputs["order"][start:stop]
+        for name, values in project_product_rows(**partition_inputs(inputs, rows)).items():
+            outputs[name][rows] = values
+    finally:
+        # Views into the blocks have to go before the blocks can be closed
+        del inputs, outputs
+        for block in list(input_blocks.values()) + list(output_blocks.values()):
+            block.close()
+
+
+def project_product_so_parallel(so_df, product_demand, wh_col="WH ID", hub_col="hub_id", wh_stock=None,
+                                workers=None, product_chunks=1):
+    # project_product_so partitioned by WH (and optionally product_chunks product ranges per WH)
+    # over a process pool. Inputs and outputs live in shared memory, each worker fills the rows
+    # of its partitions, so the result is the same as the single-process run. The parent only
+    # shares the raw columns; share matrices and stock groups are built in the workers.
+    order, bounds = partition_rows(so_df[wh_col].to_numpy(), so_df["product_id"].to_numpy(), product_chunks)
+    workers = min(workers or os.cpu_count() or 1, len(bounds))
+
+    if workers <= 1:
+        return product_projection(so_df, project_product_rows(**product_row_inputs(so_df, product_demand, wh_col, wh_stock)),
+                                  wh_col, hub_col)
+
+    n_rows, n_days = len(so_df), product_demand.demand.shape[2]
+    metric_names = ["Updated Hub Qty", "Predicted SO Qty"] + (["Allocated SO Qty"] if wh_stock is not None else [])
+
+    # Without a priority column the extract's row order is the priority
+    inputs = {name: so_df[name].to_numpy(dtype=float) for name in ROW_COLUMNS[1:]}
+    inputs.update({
+        "order": order,
+        "product_id": so_df["product_id"].to_numpy(),
+        WH_COL: so_df[wh_col].to_numpy(),
+        HUB_PRIORITY_COL: (so_df[HUB_PRIORITY_COL].to_numpy(dtype=float) if HUB_PRIORITY_COL in so_df
+                           else np.arange(n_rows, dtype=float)),
+        "product_ids": product_demand.product_ids,
+        "wh_ids": product_demand.wh_ids,
+        "demand": product_demand.demand,
+    })
+    if wh_stock is not None:
+        inputs.update({
+            "stock": wh_stock.to_numpy(dtype=float),
+            "stock_wh": wh_stock.index.get_level_values(0).to_numpy(),
+            "stock_product": wh_stock.index.get_level_values(1).to_numpy(),
+        })
+
+    blocks = []
+    try:
+        input_blocks, input_specs = to_shared(inputs)
+        blocks += input_blocks.values()
+        output_blocks, output_specs = to_shared({name: np.zeros((n_rows, n_days)) for name in metric_names})
+        blocks += output_blocks.values()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(project_partition, input_specs, output_specs, start, stop) for start, stop in bounds]
+            for future in futures:
+                future.result()
+
+        metrics = {name: np.ndarray((n_rows, n_days), buffer=output_blocks[name].buf).copy() for name in metric_names}
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return product_projection(so_df, metrics, wh_col, hub_col)
@@ -0,0 +1,206 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Dry SKUs carried by both dry WHs are split between them, single-WH SKUs go whole to their WH
+SHARED_SKU_SPLIT = {772: 0.62, 40: 0.38}
+
+# Optional SO extract column ranking hubs for WH stock (lower goes first); without it the
+# extract's row order is the priority, as in the qty_so_final cumulative SO check
+HUB_PRIORITY_COL = "priority"
+
+
+class ProductDemand(NamedTuple):
+    # Dry forecast allocated to WHs, demand[product, wh, day] indexed by the sorted id arrays
+    product_ids: np.ndarray
+    wh_ids: np.ndarray
+    demand: np.ndarray
+
+
+def product_daily_forecast(forecast_df, forecast_dates):
+    # products x days matrix of Forecast Step 3 (0 where a product has no forecast that day)
+    dates = pd.DatetimeIndex(pd.to_datetime(list(forecast_dates)))
+    product_id = pd.to_numeric(forecast_df["product_id"], errors="coerce").to_numpy()
+    day_pos = dates.get_indexer(pd.to_datetime(forecast_df["date_key"], errors="coerce"))
+    keep = (day_pos >= 0) & ~np.isnan(product_id)
+
+    product_ids, product_pos = np.unique(product_id[keep], return_inverse=True)
+    forecast = np.zeros((len(product_ids), len(dates)))
+    np.add.at(forecast, (product_pos, day_pos[keep]),
+              pd.to_numeric(forecast_df["Forecast Step 3"], errors="coerce").fillna(0).to_numpy()[keep])
+    return product_ids, forecast
+
+
+def product_positions(product_ids, product_id):
+    # Position of each product id in the sorted product_ids, and whether it was found there
+    product_id = np.asarray(product_id)
+    if not len(product_ids):
+        return np.zeros(len(product_id), dtype=int), np.zeros(len(product_id), dtype=bool)
+    pos = np.minimum(np.searchsorted(product_ids, product_id), len(product_ids) - 1)
+    return pos, product_ids[pos] == product_id
+
+
+def allocate_product_demand(forecast_df, so_df, forecast_dates, wh_col="WH ID"):
+    # Per (product, WH, day) dry demand for all products and days at once. Which WHs carry a
+    # product comes from the SO extract: shared SKUs get the SHARED_SKU_SPLIT, single-WH
+    # SKUs their full forecast, truncated to whole units like the per-product loop did.
+    product_ids, forecast = product_daily_forecast(forecast_df, forecast_dates)
+    wh_ids = np.array(list(SHARED_SKU_SPLIT))
+
+    product_pos, found = product_positions(product_ids, so_df["product_id"].to_numpy())
+    wh_pos = pd.Index(wh_ids).get_indexer(so_df[wh_col].to_numpy())
+    known = found & (wh_pos >= 0)
+
+    carried = np.zeros((len(product_ids), len(wh_ids)), dtype=bool)
+    carried[product_pos[known], wh_pos[known]] = True
+
+    shared = carried.all(axis=1)
+    split = np.where(shared[:, None], np.array(list(SHARED_SKU_SPLIT.values())), carried.astype(float))
+    demand = np.trunc(forecast[:, None, :] * split[:, :, None])
+    return ProductDemand(product_ids, wh_ids, demand)
+
+
+def product_share_matrix(so_df, product_demand, wh_col="WH ID"):
+    # Sparse rows x (product, WH) matrix holding each SO row's share of its (WH, product) demand:
+    # the row's Sum of qty_so_final over the (WH, product) total, or an even split over the
+    # hubs carrying the product when none of them has an SO. Columns are product * n_whs + wh,
+    # matching demand.reshape(-1, days); rows whose product / WH has no forecast stay empty.
+    product_ids, wh_ids, _ = product_demand
+    product_pos, found = product_positions(product_ids, so_df["product_id"].to_numpy())
+    wh_pos = pd.Index(wh_ids).get_indexer(so_df[wh_col].to_numpy())
+    rows = np.flatnonzero(found & (wh_pos >= 0))
+    columns = product_pos[rows] * len(wh_ids) + wh_pos[rows]
+    n_columns = len(product_ids) * len(wh_ids)
+
+    so_final = so_df["Sum of qty_so_final"].fillna(0).to_numpy(dtype=float)[rows]
+    total = np.bincount(columns, weights=so_final, minlength=n_columns)[columns]
+    count = np.bincount(columns, minlength=n_columns)[columns]
+    share = np.divide(so_final, total, out=1 / np.maximum(count, 1), where=total > 0)
+    return sp.csr_matrix((share, (rows, columns)), shape=(len(so_df), n_columns))
+
+
+def allocate_wh_stock(demand, group, stock, priority=None):
+    # WH stock handed out to hubs in priority order: within each (WH, product) group a hub
+    # gets its full SO while the group's cumulative SO still fits the WH stock, and nothing
+    # once it does not (like qty_so_final). Every day is allocated against the WH stock
+    # snapshot: each day's SO is a what-if from the original hub qty, so earlier days'
+    # allocations are not deducted (that would charge the same refill to the WH twice).
+    # demand is rows x days, group the row's group index into stock. Rows are sorted once by
+    # (group, priority) and all days are one grouped cumsum.
+    order = np.lexsort((priority, group)) if priority is not None else np.argsort(group, kind="stable")
+    sorted_group = group[order]
+    sorted_demand = np.clip(np.nan_to_num(demand[order]), 0, None)
+
+    if not len(order):
+        return np.zeros_like(sorted_demand)
+
+    starts = np.flatnonzero(np.r_[True, sorted_group[1:] != sorted_group[:-1]])
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(order)]))
+    cumulative = np.cumsum(sorted_demand, axis=0)
+    cumulative -= (cumulative[starts] - sorted_demand[starts])[segment]
+    allocated = np.where(cumulative <= stock[sorted_group][:, None], sorted_demand, 0)
+
+    result = np.empty_like(allocated)
+    result[order] = allocated
+    return result
+
+
+class ProductProjection(NamedTuple):
+    # Product-level projection held as arrays over the SO rows: each row is a (WH, hub, product)
+    # coordinate given by int32 codes into the sorted id arrays, each metric is a rows x days
+    # float32 array. DataFrames are only built for the slice on screen (projection_frame).
+    wh_ids: np.ndarray
+    hub_ids: np.ndarray
+    product_ids: np.ndarray
+    wh_code: np.ndarray
+    hub_code: np.ndarray
+    product_code: np.ndarray
+    max_qty: np.ndarray
+    metrics: dict
+
+
+def encode_column(values):
+    # Sorted distinct ids and an int32 code per value
+    ids, codes = np.unique(values, return_inverse=True)
+    return ids, codes.astype(np.int32)
+
+
+def product_row_inputs(so_df, product_demand, wh_col="WH ID", wh_stock=None):
+    # Per-row float arrays the projection runs on: the demand landing on each row (one sparse
+    # multiply of the share matrix with the (product, WH) x days demand), hub state and, with
+    # wh_stock, the (WH, product) stock group it draws from.
+    # Without a priority column the extract's row order is the priority.
+    demand = product_demand.demand
+    inputs = {
+        "hub_demand": product_share_matrix(so_df, product_demand, wh_col) @ demand.reshape(-1, demand.shape[2]),
+        "hub_qty": so_df["Sum of hub_qty"].to_numpy(dtype=float),
+        "max_qty": so_df["Sum of maxqty"].to_numpy(dtype=float),
+        "multiplier": so_df["Sum of multiplier"].to_numpy(dtype=float),
+    }
+
+    if wh_stock is not None:
+        wh_product = pd.MultiIndex.from_arrays([so_df[wh_col].to_numpy(), so_df["product_id"].to_numpy()])
+        group, group_keys = pd.factorize(wh_product) if len(wh_product) else (np.zeros(0, dtype=np.intp), wh_product)
+        inputs["group"] = group
+        inputs["stock"] = wh_stock.reindex(group_keys).fillna(np.inf).to_numpy(dtype=float)
+        inputs["priority"] = (so_df[HUB_PRIORITY_COL].to_numpy(dtype=float) if HUB_PRIORITY_COL in so_df
+                              else np.arange(len(so_df), dtype=float))
+    return inputs
+
+
+def project_product_rows(hub_demand, hub_qty, max_qty, multiplier, group=None, stock=None, priority=None):
+    # rows x days metrics for a set of rows; stock groups must not be split across calls.
+    # Predicted SO is rounded to whole units, so the allocation's running sums are exact
+    # whatever order they are added in.
+    updated = np.clip(hub_qty[:, None] - hub_demand, 0, None)
+    predicted = np.round(((max_qty[:, None] - updated) / multiplier[:, None]) * multiplier[:, None])
+
+    metrics = {
+        "Updated Hub Qty": updated,
+        "Predicted SO Qty": predicted,
+    }
+    if stock is not None:
+        metrics["Allocated SO Qty"] = allocate_wh_stock(predicted, group, stock, priority)
+    return metrics
+
+
+def product_projection(so_df, metrics, wh_col="WH ID", hub_col="hub_id"):
+    # Package rows x days metrics with the rows' (WH, hub, product) codes
+    wh_ids, wh_code = encode_column(so_df[wh_col].to_numpy())
+    hub_ids, hub_code = encode_column(so_df[hub_col].to_numpy())
+    product_ids, product_code = encode_column(so_df["product_id"].to_numpy())
+    return ProductProjection(
+        wh_ids, hub_ids, product_ids, wh_code, hub_code, product_code,
+        so_df["Sum of maxqty"].to_numpy(dtype=np.float32),
+        {name: values.astype(np.float32) for name, values in metrics.items()},
+    )
+
+
+def project_product_so(so_df, product_demand, wh_col="WH ID", hub_col="hub_id", wh_stock=None):
+    # Updated hub qty and predicted SO qty per (WH, hub, product) row for every day.
+    # Each row gets its share of its (WH, product) demand.
+    # With wh_stock (stock per (wh_id, product_id)), Allocated SO Qty is the part of each day's
+    # SO the WH stock covers; WH / products without a stock record are not capped.
+    metrics = project_product_rows(**product_row_inputs(so_df, product_demand, wh_col, wh_stock))
+    return product_projection(so_df, metrics, wh_col, hub_col)
+
+
+def projection_frame(projection, wh_id=None, day=None):
+    # Wide "<metric> D+<day>" table for one WH (or all) and one day (or all days), in the
+    # column layout of pivot_by_day
+    rows = np.ones(len(projection.wh_code), dtype=bool) if wh_id is None else projection.wh_ids[projection.wh_code] == wh_id
+    n_days = next(iter(projection.metrics.values())).shape[1]
+    days = range(1, n_days + 1) if day is None else [day]
+
+    frame = pd.DataFrame({
+        "WH ID": projection.wh_ids[projection.wh_code[rows]],
+        "Hub ID": projection.hub_ids[projection.hub_code[rows]],
+        "product_id": projection.product_ids[projection.product_code[rows]],
+        "Sum of maxqty": projection.max_qty[rows],
+    })
+    for d in days:
+        for name, values in projection.metrics.items():
+            frame[f"{name} D+{d}"] = values[rows, d - 1]
+    return frame
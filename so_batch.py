@@ -0,0 +1,172 @@
+import argparse
+import datetime
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+from batch_io import (
+    BATCH_OUTPUT_DIR, NEXT_DAY_FILE, PRODUCT_PROJECTION_FILE, PROJECTION_FILE, batch_run_dir, write_table,
+)
+from forecast_store import PRODUCT_FORECAST_FILE, build_forecast_cube, forecast_parquet, load_product_forecast
+from inventory_position import build_inventory_position, guarded_merge, hub_in_transit, wh_stock
+from product_polars import POLARS_AVAILABLE, project_product_so_polars
+from product_pool import project_product_so_parallel
+from product_projection import allocate_product_demand, projection_frame
+from so_projection import (
+    MAX_HORIZON, get_forecast_dates, next_day_so, prepare_so, project_hub_so, wh_daily_demand,
+)
+
+# Product-level projection backends; polars is optional
+PRODUCT_BACKENDS = ["pandas", "polars"]
+
+# Every run is expected to cover these WHs (KOS, STL, PGS, CBN)
+BATCH_WHS = [40, 772, 160, 661]
+
+
+@contextmanager
+def stage(name, timings):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+    print(f"{name:<24} {timings[name]:8.3f}s")
+
+
+def run_product_projection(product_so_path, forecast_dates, workers=None, product_chunks=1, backend="pandas"):
+    # Product-level D+1..D+N projection (as in drykhusus.py) as a wide table. The pandas backend
+    # runs over a process pool, the polars backend as one lazy query.
+    product_so_df = prepare_so(pd.read_excel(product_so_path), id_cols=["wh_id", "product_id", "hub_id"])
+    inventory_position = build_inventory_position()
+
+    if backend == "polars":
+        return projection_frame(project_product_so_polars(product_so_df, inventory_position, forecast_dates))
+
+    product_so_df = guarded_merge(product_so_df, hub_in_transit(inventory_position), "stock in transit")
+    product_so_df["Sum of hub_qty"] += product_so_df["in_transit"]
+
+    product_demand = allocate_product_demand(load_product_forecast(forecast_dates), product_so_df, forecast_dates, wh_col="wh_id")
+    projection = project_product_so_parallel(product_so_df, product_demand, wh_col="wh_id",
+                                             wh_stock=wh_stock(inventory_position)["stock"],
+                                             workers=workers, product_chunks=product_chunks)
+    return projection_frame(projection)
+
+
+def measure_product_projection(*args):
+    # Run in a fresh process: (seconds, peak RSS in MB incl. pool workers, result)
+    # resource is Unix-only, so it is only imported where peak memory is measured
+    import resource
+    start = time.perf_counter()
+    product_df = run_product_projection(*args)
+    seconds = time.perf_counter() - start
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return seconds, peak_kb / 1024, product_df
+
+
+def same_projection(left, right, rtol=1e-5, atol=1e-3):
+    # Same rows and columns, values equal within float32 tolerance: the backends add the
+    # demand shares up in a different order
+    try:
+        pd.testing.assert_frame_equal(left, right, check_dtype=False, check_exact=False, rtol=rtol, atol=atol)
+    except AssertionError:
+        return False
+    return True
+
+
+def compare_product_backends(product_so_path, forecast_dates, workers=None, product_chunks=1):
+    # Runtime and peak memory of every backend, each in its own spawned process, and whether
+    # they give the same projection
+    forecast_parquet(PRODUCT_FORECAST_FILE)
+    results = {}
+    for backend in PRODUCT_BACKENDS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[backend] = pool.submit(measure_product_projection, product_so_path, forecast_dates,
+                                           workers, product_chunks, backend).result()
+        seconds, peak_mb, _ = results[backend]
+        print(f"{backend:<24} {seconds:8.3f}s  peak RSS {peak_mb:8.1f} MB")
+
+    frames = [product_df for _, _, product_df in results.values()]
+    same = all(same_projection(frames[0], product_df) for product_df in frames[1:])
+    print(f"{'same results':<24} {same}")
+    return results
+
+
+def run_batch(so_path, run_date, horizon=6, carry_over=True, out_dir=BATCH_OUTPUT_DIR, fmt="parquet",
+              product_so_path=None, workers=None, product_chunks=1, backend="pandas"):
+    timings = {}
+
+    with stage("load SO extract", timings):
+        final_so_df = prepare_so(pd.read_excel(so_path))
+
+    with stage("load forecasts", timings):
+        forecast_dates = get_forecast_dates(run_date, horizon)
+        forecast_cube = build_forecast_cube()
+
+    with stage("next day SO", timings):
+        next_day_df = next_day_so(final_so_df)
+
+    with stage(f"D+1..D+{horizon} projection", timings):
+        wh_demand = wh_daily_demand(forecast_cube, forecast_dates)
+        projection_df = project_hub_so(next_day_df, wh_demand, carry_over=carry_over)
+        projection_df["date"] = pd.to_datetime(run_date) + pd.to_timedelta(projection_df["day"], unit="D")
+
+    product_df = None
+    if product_so_path:
+        with stage(f"product D+1..D+{horizon}", timings):
+            product_df = run_product_projection(product_so_path, forecast_dates, workers, product_chunks, backend)
+
+    missing_whs = sorted(set(BATCH_WHS) - set(next_day_df["WH ID"]))
+    if missing_whs:
+        print(f"warning: SO extract has no rows for WH {missing_whs}")
+
+    with stage("write results", timings):
+        run_dir = batch_run_dir(run_date, out_dir)
+        os.makedirs(run_dir, exist_ok=True)
+        write_table(next_day_df, os.path.join(run_dir, NEXT_DAY_FILE), fmt)
+        write_table(projection_df, os.path.join(run_dir, PROJECTION_FILE), fmt)
+        if product_df is not None:
+            write_table(product_df, os.path.join(run_dir, PRODUCT_PROJECTION_FILE), fmt)
+
+    print(f"{'total':<24} {sum(timings.values()):8.3f}s  -> {run_dir}")
+    return next_day_df, projection_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute next day and D+1..D+N SO projections for all WHs")
+    parser.add_argument("so_file", help="SQL-estimated SO extract (xlsx)")
+    parser.add_argument("--date", help="run date YYYY-MM-DD (default: today)")
+    parser.add_argument("--horizon", type=int, default=6, help=f"days to project, up to {MAX_HORIZON}")
+    parser.add_argument("--no-carry-over", action="store_true", help="restart every day from the original hub qty")
+    parser.add_argument("--out-dir", default=BATCH_OUTPUT_DIR)
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--product-so-file", help="product-level SO extract (xlsx) to also project per product")
+    parser.add_argument("--workers", type=int, help="processes for the product-level projection (default: all cores)")
+    parser.add_argument("--product-chunks", type=int, default=1, help="product ranges per WH for the process pool")
+    parser.add_argument("--backend", choices=PRODUCT_BACKENDS, default="pandas", help="product-level projection backend")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="only time the product-level backends (runtime, peak memory) and check they agree")
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.horizon <= MAX_HORIZON:
+        parser.error(f"--horizon must be between 1 and {MAX_HORIZON}")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.product_chunks < 1:
+        parser.error("--product-chunks must be at least 1")
+    if (args.backend == "polars" or args.compare_backends) and not POLARS_AVAILABLE:
+        parser.error("the polars backend needs polars installed (pip install polars)")
+    if args.compare_backends and not args.product_so_file:
+        parser.error("--compare-backends needs --product-so-file")
+
+    run_date = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today()
+    if args.compare_backends:
+        compare_product_backends(args.product_so_file, get_forecast_dates(run_date, args.horizon), args.workers, args.product_chunks)
+        return
+    run_batch(args.so_file, run_date, args.horizon, not args.no_carry_over, args.out_dir, args.format,
+              args.product_so_file, args.workers, args.product_chunks, args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from forecast_store import forecast_cube_slice
+from dimensions import PRODUCT_TYPE_WHS, UNKNOWN_WH, add_dim_codes, excluded_mask, wh_codes
+
+# Longest D+N horizon the SO projection supports
+MAX_HORIZON = 30
+
+
+# Dry forecast is split between the two dry WHs, fresh forecast goes whole to its WH
+DRY_WH_SPLIT = {772: 1/3, 40: 2/3}
+FORECAST_WH_SPLIT = {
+    "Dry": DRY_WH_SPLIT,
+    "Fresh CBN": {661: 1},
+    "Fresh PGS": {160: 1},
+}
+
+# Share of the predicted SO the dry WHs actually ship
+WH_SO_FACTOR = {40: 0.71, 772: 0.535}
+
+# Display labels for the SO vs reorder point flag (code 0 / 1)
+TRIGGER_STATUS = ["Not Triggered", "Triggered"]
+
+
+def get_forecast_dates(start, horizon):
+    # D+1 .. D+horizon as 'YYYY-MM-DD' strings
+    return [(start + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(1, horizon + 1)]
+
+
+def prepare_so(final_so_df, id_cols=('wh_id', 'hub_id')):
+    # Numeric IDs, wh_code / hub_code attached, excluded hubs and WHs dropped
+    final_so_df[list(id_cols)] = final_so_df[list(id_cols)].apply(pd.to_numeric)
+    final_so_df["hub_id"] = final_so_df["hub_id"].astype(int)
+    final_so_df = add_dim_codes(final_so_df)
+    return final_so_df[~excluded_mask(final_so_df)]
+
+
+def next_day_so(final_so_df):
+    # Predicted SO Qty D+0 from today's hub qty, with wh_id renamed to WH ID
+    final_so_df = final_so_df.rename(columns={"wh_id": "WH ID"})
+    final_so_df['Predicted SO Qty D+0'] = ((final_so_df['Sum of maxqty'] - final_so_df['Sum of hub_qty']) /
+                                           final_so_df['Sum of multiplier']) * final_so_df['Sum of multiplier']
+    final_so_df['Predicted SO Qty D+0'] = final_so_df['Predicted SO Qty D+0'].clip(lower=0).astype(int)
+    return final_so_df
+
+
+def wh_daily_demand(forecast_cube, forecast_dates):
+    # Demand forecast allocated to WHs: one row per WH, one column per day (1..N).
+    # Daily totals are read from the forecast cube by position, then spread over WHs
+    # with a product type x WH split matrix.
+    totals = forecast_cube_slice(forecast_cube, forecast_dates)
+
+    wh_ids = [wh_id for split in FORECAST_WH_SPLIT.values() for wh_id in split]
+    split_matrix = np.zeros((forecast_cube.shape[1], len(wh_ids)))
+    for i, source in enumerate(forecast_cube.columns):
+        for wh_id, split in FORECAST_WH_SPLIT.get(source, {}).items():
+            split_matrix[i, wh_ids.index(wh_id)] = split
+
+    demand = np.trunc(totals @ split_matrix)
+    return pd.DataFrame(demand.T, index=wh_ids, columns=range(1, len(forecast_dates) + 1))
+
+
+def hub_shares(so_df, wh_col="WH ID"):
+    # Each row's share of its WH's total Sum of qty_so_final (0 when the WH total is 0)
+    # WH totals via bincount over the dense WH codes (WHs outside the dimension share the
+    # unknown code, they get no demand allocated anyway)
+    so_final = so_df["Sum of qty_so_final"].fillna(0).to_numpy(dtype=float)
+    codes = so_df["wh_code"].to_numpy() if "wh_code" in so_df else wh_codes(so_df[wh_col].to_numpy())
+    wh_total = np.bincount(codes, weights=so_final, minlength=UNKNOWN_WH + 1)[codes]
+    return np.divide(so_final, wh_total, out=np.zeros_like(so_final), where=wh_total > 0)
+
+
+def predicted_so_qty(updated, max_qty, multiplier, factor):
+    # SO needed to refill hubs back to max qty, scaled by the WH ship factor
+    predicted = ((max_qty - updated) / multiplier) * multiplier
+    return np.clip(predicted * factor, 0, None).astype(int)
+
+
+def so_triggered(predicted, reorder_point):
+    # SO vs reorder point: triggered when the SO is non-zero and below the reorder point
+    return (predicted != 0) & (predicted - reorder_point < 0)
+
+
+def trigger_status(triggered):
+    # Categorical "Triggered" / "Not Triggered" labels over a boolean trigger array
+    codes = np.asarray(triggered, dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=TRIGGER_STATUS)
+
+
+def hub_state_arrays(so_df, wh_col="WH ID"):
+    # Per-row hub inputs of the projection as float arrays
+    return {
+        "hub_qty": so_df["Sum of hub_qty"].to_numpy(dtype=float),
+        "max_qty": so_df["Sum of maxqty"].to_numpy(dtype=float),
+        "multiplier": so_df["Sum of multiplier"].to_numpy(dtype=float),
+        "reorder_point": so_df["Sum of reorder_point"].to_numpy(dtype=float),
+        "factor": so_df[wh_col].map(WH_SO_FACTOR).fillna(1).to_numpy(dtype=float),
+    }
+
+
+def run_hub_projection(hub_demand, hub_qty, max_qty, multiplier, reorder_point, factor, carry_over=False):
+    # Core recurrence on (..., rows, days) demand arrays; any leading axes (e.g. scenarios)
+    # are carried through. Returns updated hub qty, predicted SO qty and trigger flags.
+    if carry_over:
+        updated = np.empty_like(hub_demand)
+        predicted = np.empty(hub_demand.shape, dtype=int)
+        triggered = np.empty(hub_demand.shape, dtype=bool)
+        stock = hub_qty
+        for i in range(hub_demand.shape[-1]):
+            updated[..., i] = np.clip(stock - hub_demand[..., i], 0, None)
+            predicted[..., i] = predicted_so_qty(updated[..., i], max_qty, multiplier, factor)
+            triggered[..., i] = so_triggered(predicted[..., i], reorder_point)
+            stock = np.fmin(updated[..., i] + np.where(triggered[..., i], predicted[..., i], 0), max_qty)
+    else:
+        updated = np.clip(hub_qty[:, None] - hub_demand, 0, None)
+        predicted = predicted_so_qty(updated, max_qty[:, None], multiplier[:, None], factor[:, None])
+        triggered = so_triggered(predicted, reorder_point[:, None])
+
+    return updated, predicted, triggered
+
+
+def project_hub_so(so_df, wh_demand, wh_col="WH ID", keys=("WH ID", "hub_id"), carry_cols=("Sum of maxqty",), carry_over=False):
+    # Updated hub qty, predicted SO qty and the reorder point trigger for every day in
+    # wh_demand, computed in one pass and returned as one long table keyed by keys + day.
+    # With carry_over, each day starts from the previous day's stock plus the SO triggered
+    # the day before (capped at max qty) instead of from the original hub qty.
+    days = list(wh_demand.columns)
+
+    # rows x days demand landing on each hub
+    share = hub_shares(so_df, wh_col)
+    demand = wh_demand.reindex(so_df[wh_col].to_numpy(), fill_value=0).to_numpy(dtype=float)
+    hub_demand = np.trunc(share[:, None] * demand)
+
+    updated, predicted, triggered = run_hub_projection(hub_demand, carry_over=carry_over, **hub_state_arrays(so_df, wh_col))
+
+    if pd.api.types.is_integer_dtype(so_df["Sum of hub_qty"]):
+        updated = updated.astype(int)
+
+    return long_by_day(so_df, list(keys) + list(carry_cols), days, {
+        "Updated Hub Qty": updated,
+        "Predicted SO Qty": predicted,
+        "Triggered": triggered,
+    })
+
+
+def simulate_so_scenarios(so_df, wh_demand, n_scenarios=1000, demand_cv=0.2, seed=None, wh_col="WH ID",
+                          keys=("WH ID", "hub_id"), carry_cols=("Sum of maxqty",), carry_over=True):
+    # Monte Carlo version of project_hub_so: WH/day demand is sampled around the point
+    # forecast (mean-preserving lognormal with the given CV) and every scenario is run
+    # through the projection as one scenarios x rows x days array.
+    # Returns P10/P50/P90 predicted SO qty and the trigger probability per row and day.
+    days = list(wh_demand.columns)
+    rng = np.random.default_rng(seed)
+
+    sigma = np.sqrt(np.log1p(demand_cv ** 2))
+    noise = rng.lognormal(-sigma ** 2 / 2, sigma, size=(n_scenarios,) + wh_demand.shape)
+    demand_paths = np.trunc(wh_demand.to_numpy(dtype=float) * noise)
+
+    # Each row's WH position in wh_demand; rows of WHs without demand get an all-zero path
+    wh_pos = wh_demand.index.get_indexer(so_df[wh_col].to_numpy())
+    demand_paths = np.concatenate([demand_paths, np.zeros((n_scenarios, 1, len(days)))], axis=1)
+    row_demand = demand_paths[:, wh_pos, :]
+
+    share = hub_shares(so_df, wh_col)
+    hub_demand = np.trunc(share[None, :, None] * row_demand)
+
+    _, predicted, triggered = run_hub_projection(hub_demand, carry_over=carry_over, **hub_state_arrays(so_df, wh_col))
+
+    p10, p50, p90 = np.percentile(predicted, [10, 50, 90], axis=0)
+    return long_by_day(so_df, list(keys) + list(carry_cols), days, {
+        "P10 SO Qty": p10.astype(int),
+        "P50 SO Qty": p50.astype(int),
+        "P90 SO Qty": p90.astype(int),
+        "Trigger Probability": triggered.mean(axis=0),
+    })
+
+
+def long_by_day(so_df, columns, days, metrics):
+    # Stack rows x days metric arrays into a long table; so_df columns are repeated per day
+    n_days = len(days)
+    long_df = pd.DataFrame({col: np.repeat(so_df[col].to_numpy(), n_days) for col in columns})
+    long_df["day"] = np.tile(np.asarray(days, dtype=np.int16), len(so_df))
+    for name, values in metrics.items():
+        long_df[name] = values.ravel()
+    return long_df
+
+
+def pivot_by_day(long_df, keys, values, static=None):
+    # Wide display table with one "<value> D+<day>" column per value and day.
+    # Rows sharing a key are aggregated with the given aggfuncs instead of fanning out.
+    keys = list(keys)
+    wide = long_df.groupby(keys + ["day"], sort=False, dropna=False).agg(values).unstack("day")
+    days = sorted(wide.columns.get_level_values("day").unique())
+    wide = wide[[(value, day) for day in days for value in values]]
+    wide.columns = [f"{value} D+{day}" for value, day in wide.columns]
+
+    if static:
+        first_day = long_df[long_df["day"] == days[0]]
+        wide = first_day.groupby(keys, sort=False, dropna=False).agg(static).join(wide)
+
+    return wide.reset_index()
+
+
+def hub_chart_series(projection_df, start, hub_col="hub_id", wh_col="WH ID"):
+    # Per-hub plot series from the long projection, keyed by (hub_id, product type):
+    # one (WH ID, Date, SO Quantity) row per WH and day
+    series = (projection_df.groupby([hub_col, wh_col, "day"], sort=True)["Predicted SO Qty"].sum()
+              .reset_index()
+              .rename(columns={"Predicted SO Qty": "SO Quantity"}))
+    series["Date"] = pd.Timestamp(start) + pd.to_timedelta(series["day"], unit="D")
+
+    cache = {}
+    for hub_id, hub_series in series.groupby(hub_col, sort=False):
+        for product_type, wh_ids in PRODUCT_TYPE_WHS.items():
+            cache[(hub_id, product_type)] = hub_series.loc[hub_series[wh_col].isin(wh_ids), [wh_col, "Date", "SO Quantity"]].reset_index(drop=True)
+    return cache